@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class AutotagConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'autotag'
\ No newline at end of file
+    name = 'autotag'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
 import json
 from pathlib import Path
-from autotag.utils import import_rules_from_json, generate_sample_rules
+from autotag.utils import import_rules_from_dict, generate_sample_rules
 from autotag.models import Company
 
 
@@ -41,8 +41,9 @@ class Command(BaseCommand):
             }
             
             try:
+                # Serialize up front so the file gets a single write
                 with open(file_path, 'w') as f:
-                    json.dump(sample_rules, f, indent=2)
+                    f.write(json.dumps(sample_rules, indent=2))
                 
                 self.stdout.write(
                     self.style.SUCCESS(f"Sample rules file created at: {file_path}")
@@ -61,19 +62,20 @@ class Command(BaseCommand):
         if not Path(file_path).exists():
             raise CommandError(f"File not found: {file_path}")
         
+        # Read raw bytes and parse them once; the parsed document is handed
+        # straight to the importer
         try:
-            with open(file_path, 'r') as f:
-                json_data = f.read()
+            data = json.loads(Path(file_path).read_bytes())
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise CommandError(f"Invalid JSON: {str(e)}")
         except Exception as e:
             raise CommandError(f"Error reading file: {str(e)}")
         
-        # Parse JSON to check company
-        try:
-            data = json.loads(json_data)
-            company_code = data.get('company_code')
-            company_name = data.get('company_name', company_code)
-        except json.JSONDecodeError as e:
-            raise CommandError(f"Invalid JSON: {str(e)}")
+        if not isinstance(data, dict):
+            raise CommandError("JSON must be an object containing 'company_code'")
+        
+        company_code = data.get('company_code')
+        company_name = data.get('company_name', company_code)
         
         if not company_code:
             raise CommandError("JSON must contain 'company_code'")
@@ -95,7 +97,7 @@ class Command(BaseCommand):
         # Import the rules
         self.stdout.write(f"Importing rules for company: {company_code}")
         
-        results = import_rules_from_json(json_data)
+        results = import_rules_from_dict(data)
         
         if 'error' in results:
             raise CommandError(results['error'])
@@ -1,6 +1,11 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 from autotag.services import AutoTagService
+from autotag.workers import init_worker, tag_batch
 from transactions.models import Transaction
 
 
@@ -39,6 +44,13 @@ class Command(BaseCommand):
             default=100,
             help='Batch size for processing (default: 100)'
         )
+        
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes used by --all (default: 1, no pool)'
+        )
     
     def handle(self, *args, **options):
         company_code = options['company_code']
@@ -46,6 +58,7 @@ class Command(BaseCommand):
         tag_all = options.get('all')
         retag = options.get('retag')
         batch_size = options.get('batch_size')
+        workers = options.get('workers') or 1
         
         service = AutoTagService()
         
@@ -93,31 +106,35 @@ class Command(BaseCommand):
                 except Company.DoesNotExist:
                     raise CommandError(f"Company '{company_code}' not found or inactive")
                 
-                # Get all transactions that haven't been tagged by this company
-                tagged_txn_ids = TransactionTag.objects.filter(
-                    company=company
-                ).values_list('transaction_id', flat=True)
-                
-                untagged_txns = Transaction.objects.exclude(
-                    id__in=tagged_txn_ids
+                # Anti-join against this company's tags so the set difference
+                # happens in the database rather than in Python
+                untagged_txns = Transaction.objects.filter(
+                    ~Exists(
+                        TransactionTag.objects.filter(
+                            transaction=OuterRef('pk'),
+                            company=company
+                        )
+                    )
                 )
                 
-                transaction_ids = list(untagged_txns.values_list('id', flat=True))
+                total_count = 0
+                success_count = 0
                 
-                if not transaction_ids:
+                batches = self._untagged_batches(untagged_txns, batch_size)
+                
+                for batch_ids, results in self._tag_batches(
+                    service, batches, company_code, batch_size, workers
+                ):
+                    total_count += len(batch_ids)
+                    success_count += sum(1 for tag in results.values() if tag is not None)
+                
+                if not total_count:
                     self.stdout.write("No untagged transactions found")
                     return
                 
-                results = service.tag_multiple_transactions(
-                    transaction_ids,
-                    company_code,
-                    batch_size
-                )
-                
-                success_count = sum(1 for tag in results.values() if tag is not None)
                 self.stdout.write(
                     self.style.SUCCESS(
-                        f"Tagged {success_count}/{len(transaction_ids)} transactions"
+                        f"Tagged {success_count}/{total_count} transactions"
                     )
                 )
                 
@@ -146,4 +163,63 @@ class Command(BaseCommand):
             )
             
         except Exception as e:
-            raise CommandError(f"Error during tagging: {str(e)}")
\ No newline at end of file
+            raise CommandError(f"Error during tagging: {str(e)}")
+    
+    def _untagged_batches(self, untagged_txns, batch_size):
+        """
+        Yield lists of untagged transaction ids, batch_size at a time.
+        
+        Keyset paging on the primary key: each query resumes after the last
+        id seen, so sparse id ranges never cost empty queries and memory stays
+        bounded by batch_size.
+        """
+        last_id = 0
+        while True:
+            batch_ids = list(
+                untagged_txns.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch_ids:
+                return
+            yield batch_ids
+            last_id = batch_ids[-1]
+    
+    def _tag_batches(self, service, batches, company_code, batch_size, workers):
+        """
+        Tag each batch and yield (batch_ids, results) pairs.
+        
+        With more than one worker the batches are spread over a process pool.
+        Batches hold disjoint transaction ids, so workers never write the same
+        TransactionTag row. At most two batches per worker are in flight, so
+        ids are still read one batch at a time.
+        """
+        if workers <= 1:
+            for batch_ids in batches:
+                yield batch_ids, service.tag_multiple_transactions(
+                    batch_ids,
+                    company_code,
+                    batch_size
+                )
+            return
+        
+        # Spawned workers start clean: they share no connections with this
+        # process, which keeps paging ids while the pool runs
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(settings.SETTINGS_MODULE,)
+        )
+        
+        with executor:
+            pending = set()
+            for batch_ids in batches:
+                pending.add(executor.submit(tag_batch, batch_ids, company_code, batch_size))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            
+            for future in pending:
+                yield future.result()
@@ -1,10 +1,17 @@
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from collections import defaultdict
 import json
-from autotag.models import Company, TaggingRule
+from autotag.models import Company, TaggingRule, TransactionTag
 from autotag.rule_engine import AutoTagEngine
 from transactions.models import Transaction
 
 
+# Shared encoder for the indented config dumps
+_pretty_json = json.JSONEncoder(indent=2).encode
+
+
 class Command(BaseCommand):
     help = 'Test a specific tagging rule against transactions'
     
@@ -60,13 +67,11 @@ class Command(BaseCommand):
         self.stdout.write(f"Priority: {rule.priority}")
         self.stdout.write(f"Active: {rule.is_active}")
         
-        # Show rule configuration
-        self.stdout.write("\nRule configuration:")
-        self.stdout.write(json.dumps(rule.rule_config, indent=2))
-        
+        # Show rule configuration (and conditions) in a single write
+        sections = ["\nRule configuration:", _pretty_json(rule.rule_config)]
         if rule.conditions:
-            self.stdout.write("\nRule conditions:")
-            self.stdout.write(json.dumps(rule.conditions, indent=2))
+            sections += ["\nRule conditions:", _pretty_json(rule.conditions)]
+        self.stdout.write("\n".join(sections))
         
         # Get the processor
         engine = AutoTagEngine()
@@ -75,27 +80,39 @@ class Command(BaseCommand):
         if not processor:
             raise CommandError(f"No processor found for rule type: {rule.rule_type}")
         
-        # Get transactions to test
+        # Get transactions to test, joining external data so metadata access
+        # does not cost a query per transaction
+        queryset = Transaction.objects.select_related('external_data')
         if transaction_id:
-            transactions = Transaction.objects.filter(id=transaction_id)
-            if not transactions.exists():
-                raise CommandError(f"Transaction {transaction_id} not found")
+            queryset = queryset.filter(id=transaction_id)
         else:
-            transactions = Transaction.objects.all()[:sample_size]
+            queryset = queryset.all()[:sample_size]
+        
+        # Evaluate once; everything below works off this list
+        transactions = list(queryset)
         
-        self.stdout.write(f"\nTesting against {transactions.count()} transaction(s):")
+        if transaction_id and not transactions:
+            raise CommandError(f"Transaction {transaction_id} not found")
+        
+        self.stdout.write(f"\nTesting against {len(transactions)} transaction(s):")
         self.stdout.write("-" * 60)
         
         matches = 0
+        pending_tags = []
+        
+        # These are fixed for the whole run, so read them once
+        rule_config = rule.rule_config
+        rule_conditions = rule.conditions
+        check_conditions = engine._check_rule_conditions
+        process = processor.process
         
         for txn in transactions:
-            # Get metadata
-            metadata = {}
-            if hasattr(txn, 'external_data'):
-                metadata = txn.external_data.metadata
+            # Get metadata; a missing reverse one-to-one raises an
+            # AttributeError subclass, so getattr's default covers it
+            metadata = getattr(getattr(txn, 'external_data', None), 'metadata', None) or {}
             
             # Check rule conditions
-            conditions_met = engine._check_rule_conditions(txn, metadata, rule.conditions)
+            conditions_met = check_conditions(txn, metadata, rule_conditions)
             
             if not conditions_met:
                 self.stdout.write(
@@ -105,41 +122,39 @@ class Command(BaseCommand):
             
             # Process the rule
             try:
-                result = processor.process(txn, metadata, rule.rule_config)
+                result = process(txn, metadata, rule_config)
                 
                 if result:
                     matches += 1
-                    self.stdout.write(
-                        self.style.SUCCESS(f"\nTransaction {txn.id}: MATCHED → {result}")
-                    )
                     
-                    # Show transaction details
-                    self.stdout.write(f"  Product: {txn.product_code}")
-                    self.stdout.write(f"  Source: {txn.source}")
-                    self.stdout.write(f"  Jurisdiction: {txn.jurisdiction}")
-                    self.stdout.write(f"  Produce rate: {txn.produce_rate}")
+                    # Collect the match report and transaction details, then
+                    # emit them with a single write
+                    lines = [
+                        self.style.SUCCESS(f"\nTransaction {txn.id}: MATCHED → {result}"),
+                        f"  Product: {txn.product_code}",
+                        f"  Source: {txn.source}",
+                        f"  Jurisdiction: {txn.jurisdiction}",
+                        f"  Produce rate: {txn.produce_rate}",
+                    ]
                     
                     if metadata:
-                        self.stdout.write("  Metadata:")
-                        for key, value in metadata.items():
-                            self.stdout.write(f"    {key}: {value}")
+                        lines.append("  Metadata:")
+                        lines.extend(f"    {key}: {value}" for key, value in metadata.items())
                     
-                    # Save the tag if not dry run
+                    self.stdout.write("\n".join(lines))
+                    
+                    # Queue the tag for a single bulk upsert if not dry run
                     if not dry_run:
-                        from autotag.models import TransactionTag
-                        tag, created = TransactionTag.objects.update_or_create(
-                            transaction=txn,
-                            company=company,
-                            defaults={
-                                'tag_code': result,
-                                'confidence_score': 1.0,
-                                'processing_notes': f"Tagged by rule '{rule_name}' (test)"
-                            }
+                        pending_tags.append(
+                            TransactionTag(
+                                transaction=txn,
+                                company=company,
+                                tag_code=result,
+                                confidence_score=1.0,
+                                processing_notes=f"Tagged by rule '{rule_name}' (test)",
+                                updated_at=timezone.now()
+                            )
                         )
-                        if created:
-                            self.stdout.write("  → Tag saved")
-                        else:
-                            self.stdout.write("  → Tag updated")
                 else:
                     self.stdout.write(f"\nTransaction {txn.id}: No match")
                     
@@ -148,11 +163,58 @@ class Command(BaseCommand):
                     self.style.ERROR(f"\nTransaction {txn.id}: ERROR - {str(e)}")
                 )
         
+        if pending_tags:
+            created, updated = self._save_tags(company, rule_name, pending_tags)
+            self.stdout.write(f"\nSaved {created} new tag(s), updated {updated}")
+        
         # Summary
         self.stdout.write("-" * 60)
         self.stdout.write(
-            self.style.SUCCESS(f"\nMatches: {matches}/{transactions.count()}")
+            self.style.SUCCESS(f"\nMatches: {matches}/{len(transactions)}")
         )
         
         if dry_run:
-            self.stdout.write("\n(Dry run - no changes saved)")
\ No newline at end of file
+            self.stdout.write("\n(Dry run - no changes saved)")
+    
+    def _save_tags(self, company, rule_name, pending_tags):
+        """
+        Insert new tags in bulk and update the ones that already exist.
+        
+        Args:
+            company: Company the tags belong to
+            rule_name: Name of the tested rule, used in processing notes
+            pending_tags: Unsaved TransactionTag instances
+            
+        Returns:
+            Tuple of (created count, updated count)
+        """
+        with db_transaction.atomic():
+            existing_ids = set(
+                TransactionTag.objects.filter(
+                    company=company,
+                    transaction_id__in=[tag.transaction_id for tag in pending_tags]
+                ).values_list('transaction_id', flat=True)
+            )
+            
+            new_tags = [tag for tag in pending_tags if tag.transaction_id not in existing_ids]
+            if new_tags:
+                TransactionTag.objects.bulk_create(new_tags, ignore_conflicts=True)
+            
+            # One UPDATE per distinct tag code for rows that were already tagged
+            existing_by_tag = defaultdict(list)
+            for tag in pending_tags:
+                if tag.transaction_id in existing_ids:
+                    existing_by_tag[tag.tag_code].append(tag.transaction_id)
+            
+            for tag_code, transaction_ids in existing_by_tag.items():
+                TransactionTag.objects.filter(
+                    company=company,
+                    transaction_id__in=transaction_ids
+                ).update(
+                    tag_code=tag_code,
+                    confidence_score=1.0,
+                    processing_notes=f"Tagged by rule '{rule_name}' (test)",
+                    updated_at=timezone.now()
+                )
+        
+        return len(new_tags), len(pending_tags) - len(new_tags)
@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-14 03:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autotag', '0002_alter_transactiontag_transaction'),
+        ('transactions', '0002_externaldata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taggingrule',
+            name='rule_type',
+            field=models.CharField(choices=[('simple', 'Simple Mapping'), ('conditional', 'Conditional Logic'), ('script', 'CEL Expression (Legacy)'), ('cel', 'CEL Expression'), ('ml', 'Machine Learning')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='transactiontag',
+            index=models.Index(fields=['company', 'transaction'], name='txn_tags_company_txn_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.1.2 on 2026-10-14 03:26
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autotag', '0003_transactiontag_company_transaction_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='company',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.AlterField(
+            model_name='taggingrule',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.AlterField(
+            model_name='transactiontag',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now()),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-14 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autotag', '0004_created_at_db_default'),
+        ('transactions', '0002_externaldata'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactiontag',
+            index=models.Index(fields=['company', 'tag_code'], name='txn_tags_company_tag_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.1.2 on 2026-10-14 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autotag', '0005_transactiontag_company_tag_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taggingrule',
+            index=models.Index(fields=['company', 'is_active', 'priority'], name='rule_company_active_prio_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.1.2 on 2026-10-14 05:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autotag', '0006_taggingrule_company_active_priority_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='company',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='taggingrule',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='transactiontag',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
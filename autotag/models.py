@@ -40,6 +40,12 @@ class TransactionTag(models.Model):
         db_table = 'transaction_tags'
         ordering = ['-created_at']
         unique_together = ['transaction', 'company']
+        indexes = [
+            # Company-leading index for per-company scans and the untagged anti-join
+            models.Index(fields=['company', 'transaction'], name='txn_tags_company_txn_idx'),
+            # Covers the per-company tag_code GROUP BY in tagging stats
+            models.Index(fields=['company', 'tag_code'], name='txn_tags_company_tag_idx'),
+        ]
     
     def __str__(self):
         return f"Tag for Transaction {self.transaction.id}: {self.tag_code or 'Untagged'}"
@@ -80,6 +86,11 @@ class TaggingRule(models.Model):
         db_table = 'tagging_rules'
         ordering = ['company', 'priority', 'name']
         unique_together = ['company', 'name']
+        indexes = [
+            # Serves the active-rules load: filter on company and is_active,
+            # already ordered by priority
+            models.Index(fields=['company', 'is_active', 'priority'], name='rule_company_active_prio_idx'),
+        ]
     
     def __str__(self):
         return f"{self.company.code} - {self.name} ({self.rule_type})"
\ No newline at end of file
@@ -1,17 +1,72 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple
 import json
 import re
 import math
 import datetime
 import logging
+import time
 from django.utils import timezone
 import celpy
+from celpy import celtypes
+from celpy.evaluation import celstr, function_matches
+from transactions.models import ExternalData, Transaction
+from .models import TransactionTag
 
 
 # Configure security logging
 security_logger = logging.getLogger('autotag.security')
 
+# Marks a rule whose conditions have not been precompiled
+_UNCOMPILED = object()
+
+
+def _may_be_float(value: str) -> bool:
+    """
+    Cheap pre-check for float(value) on a string.
+    
+    False means float() would certainly raise ValueError: after leading
+    whitespace a float literal must start with a digit, sign, '.', or the
+    first letter of 'inf'/'nan'. True means float() has to decide.
+    """
+    stripped = value.lstrip()
+    if not stripped:
+        return False
+    first = stripped[0]
+    return first.isdecimal() or first in '+-.iInN'
+
+
+class _CelContext(dict):
+    """
+    CEL activation that keeps the raw transaction and metadata and converts
+    each of them to CEL values only once an expression references it; see
+    CelRuleProcessor._evaluate().
+    """
+    
+    # One is built per tagged transaction; no per-instance __dict__
+    __slots__ = ('transaction', 'metadata')
+    
+    def __init__(self, transaction, metadata: Dict[str, Any]):
+        super().__init__()
+        self.transaction = transaction
+        self.metadata = metadata
+
+
+class _CelContextError(Exception):
+    """Wraps a failure to convert a _CelContext entry; the cause is the original error"""
+
+
+# Shared CEL booleans; constructing BoolType costs about a microsecond
+_CEL_TRUE = celtypes.BoolType(True)
+_CEL_FALSE = celtypes.BoolType(False)
+
+
+class _NotNative(Exception):
+    """
+    Raised when a CEL expression, or one evaluation of it, falls outside the
+    subset CelRuleProcessor runs as plain Python; celpy is used instead.
+    """
+
 
 class BaseRuleProcessor(ABC):
     @abstractmethod
@@ -49,32 +104,101 @@ class SimpleRuleProcessor(BaseRuleProcessor):
     }
     """
     
+    # Transaction field names that can be mapped
+    TRANSACTION_FIELDS = frozenset({'product_code', 'source', 'jurisdiction', 'ledger_type'})
+    
     def process(self, transaction, metadata: Dict[str, Any], rule_config: Dict[str, Any]) -> Optional[str]:
         mappings = rule_config.get('mappings', {})
+        transaction_fields = self.TRANSACTION_FIELDS
+        metadata_tag = None
+        metadata_matched = False
         
-        # Transaction field names that can be mapped
-        transaction_fields = [
-            'product_code', 'source', 'jurisdiction', 'ledger_type'
-        ]
-        
-        # Check transaction fields first (higher priority)
+        # Single pass: a transaction field match returns immediately, while the
+        # first metadata match is held back because transaction fields take
+        # priority over metadata
         for field_name, field_mappings in mappings.items():
             if field_name in transaction_fields:
                 transaction_value = getattr(transaction, field_name, None)
                 if transaction_value and transaction_value in field_mappings:
                     return field_mappings[transaction_value]
+            elif not metadata_matched and field_name in metadata:
+                # Mapping keys are JSON strings; only non-string values need str()
+                value = metadata[field_name]
+                if value.__class__ is not str:
+                    value = str(value)
+                if value in field_mappings:
+                    metadata_tag = field_mappings[value]
+                    metadata_matched = True
         
-        # Check metadata fields
-        for field_name, field_mappings in mappings.items():
-            if field_name in transaction_fields:
+        return metadata_tag
+    
+    def build_index(self, rules) -> Dict[str, Any]:
+        """
+        Index simple rules by the mapping keys they can match.
+        
+        Args:
+            rules: Sequence of TaggingRule instances ordered by priority
+            
+        Returns:
+            Dict with 'rule_ids' (ids of every indexed rule), 'fields'
+            (field name -> mapping key -> ids of the rules that map that key),
+            'positions' (indexed rule id -> position in ``rules``),
+            'unindexed' (positions of the remaining rules) and
+            'metadata_fields' (whether any indexed key is a metadata field).
+            Rules whose config cannot be indexed are left out, so callers
+            must always evaluate them.
+        """
+        index = {'rule_ids': set(), 'fields': {}, 'positions': {}, 'unindexed': [], 'metadata_fields': False}
+        
+        for position, rule in enumerate(rules):
+            if rule.rule_type != 'simple' or not isinstance(rule.rule_config, dict):
+                index['unindexed'].append(position)
                 continue
-                
-            if field_name in metadata:
+            
+            mappings = rule.rule_config.get('mappings', {})
+            if not isinstance(mappings, dict) or not all(
+                isinstance(field_mappings, dict) for field_mappings in mappings.values()
+            ):
+                index['unindexed'].append(position)
+                continue
+            
+            index['rule_ids'].add(rule.id)
+            index['positions'][rule.id] = position
+            for field_name, field_mappings in mappings.items():
+                if field_name not in self.TRANSACTION_FIELDS:
+                    index['metadata_fields'] = True
+                field_index = index['fields'].setdefault(field_name, {})
+                for key in field_mappings:
+                    field_index.setdefault(key, set()).add(rule.id)
+        
+        return index
+    
+    def candidate_rule_ids(self, index: Dict[str, Any], transaction, metadata: Dict[str, Any]) -> Set[int]:
+        """
+        Return ids of indexed rules that have a mapping key for this transaction.
+        
+        Uses the same lookups as process(), so an indexed rule that is not a
+        candidate is guaranteed to return None.
+        """
+        candidates: Set[int] = set()
+        
+        for field_name, field_index in index['fields'].items():
+            if field_name in self.TRANSACTION_FIELDS:
+                value = getattr(transaction, field_name, None)
+                if not value:
+                    continue
+            elif field_name in metadata:
                 value = metadata[field_name]
-                if str(value) in field_mappings:
-                    return field_mappings[str(value)]
+                if value.__class__ is not str:
+                    value = str(value)
+            else:
+                continue
+            
+            rule_ids = field_index.get(value)
+            if rule_ids:
+                candidates |= rule_ids
         
-        return None
+        return candidates
 
 
 class ConditionalRuleProcessor(BaseRuleProcessor):
@@ -108,6 +232,15 @@ class ConditionalRuleProcessor(BaseRuleProcessor):
     }
     """
     
+    # Upper bound on cached regex patterns, independent of re's own cache
+    REGEX_CACHE_SIZE = 1024
+    
+    # Relative cost of each leaf operator, used to order group members
+    OPERATOR_COSTS = {'equals': 1, 'not_equals': 1, 'contains': 2, 'greater_than': 3, 'less_than': 3, 'regex': 5}
+    
+    def __init__(self):
+        self._regex_cache: Dict[str, re.Pattern] = {}
+    
     def process(self, transaction, metadata: Dict[str, Any], rule_config: Dict[str, Any]) -> Optional[str]:
         conditions = rule_config.get('conditions', [])
         
@@ -117,14 +250,286 @@ class ConditionalRuleProcessor(BaseRuleProcessor):
         
         return None
     
+    def compile_conditions(self, conditions) -> Optional[List[Tuple[Callable[[Any, Dict[str, Any]], bool], Any]]]:
+        """
+        Compile a rule's conditions list into (predicate, tag) pairs for
+        process_compiled(), or return None when it has to go through
+        process() condition by condition.
+        
+        Nothing is cached here: AutoTagEngine compiles each rule when it
+        loads the company's rules, and reloads them when a rule changes.
+        """
+        if not isinstance(conditions, list) or not all(isinstance(condition, dict) for condition in conditions):
+            return None
+        return [(self._compile_condition(condition), condition.get('tag')) for condition in conditions]
+    
+    def process_compiled(self, compiled, transaction, metadata: Dict[str, Any]) -> Optional[str]:
+        """Same as process() for a conditions list compiled by compile_conditions()"""
+        for predicate, tag in compiled:
+            if predicate(transaction, metadata):
+                return tag
+        
+        return None
+    
     def _evaluate_condition(self, transaction, metadata: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+        return self._walk_condition(transaction, metadata, condition)
+    
+    def _compile_condition(self, condition: Dict[str, Any]) -> Callable[[Any, Dict[str, Any]], bool]:
+        """Compile a condition, falling back to the interpreter when it cannot be compiled"""
+        try:
+            return self._compile(condition)
+        except Exception:
+            # Malformed conditions keep the interpreter's runtime behaviour,
+            # including whatever error it raises
+            return lambda transaction, metadata: self._walk_condition(transaction, metadata, condition)
+    
+    def _compile(self, condition: Dict[str, Any]) -> Callable[[Any, Dict[str, Any]], bool]:
+        """
+        Compile a condition into a predicate taking (transaction, metadata).
+        
+        Field paths, operators and expected values are resolved once here, so
+        evaluating the predicate does no dict lookups on the condition. The
+        predicate is not cached; AutoTagEngine keeps it on the rule until the
+        company's rule version changes. Behaves like _walk_condition(), except
+        for errors that cost ordering skips (see _compile_group_members()).
+        """
+        if 'conditions' in condition:
+            operator = condition.get('operator', 'and')
+            children = self._compile_group_members(operator, condition['conditions'])
+            
+            if operator == 'and':
+                def group(transaction, metadata):
+                    try:
+                        return all(child(transaction, metadata) for child in children)
+                    except Exception:
+                        # Members run in cost order, so one that raises may be
+                        # one the written order never reaches; replay in that
+                        # order to get the interpreter's result or error.
+                        # Errors a deciding cheaper member skipped stay unraised.
+                        return self._walk_condition(transaction, metadata, condition)
+            elif operator == 'or':
+                def group(transaction, metadata):
+                    try:
+                        return any(child(transaction, metadata) for child in children)
+                    except Exception:
+                        return self._walk_condition(transaction, metadata, condition)
+            else:
+                return lambda transaction, metadata: False
+            return group
+        
+        # The field path is split once and the lookup baked into the leaf,
+        # so evaluation is one closure call plus the comparison
+        field_path = condition.get('field')
+        compare = self._compile_comparison(condition.get('operator'), condition.get('value'))
+        
+        if field_path.startswith('metadata.'):
+            field_name = field_path[9:]  # Remove 'metadata.' prefix
+            return lambda transaction, metadata: compare(metadata.get(field_name))
+        return lambda transaction, metadata: compare(getattr(transaction, field_path, None))
+    
+    def _compile_group_members(self, operator: str, sub_conditions) -> List[Callable[[Any, Dict[str, Any]], bool]]:
+        """
+        Compile the members of an and/or group, cheapest first.
+        
+        Compiled predicates only return booleans, but they can raise (a
+        float() overflow, metadata that is not a dict). When a member raises,
+        the group built by _compile() replays it with _walk_condition(), so
+        the written order's result or error is kept. A cheaper member that
+        decides the group first (False in an 'and', True in an 'or') stops
+        evaluation before a costlier one runs, so an error the written order
+        would raise from that costlier member is not raised. Nested groups
+        with the same operator are merged into this one, so evaluation needs
+        no nested all()/any() frames.
+        Several ``equals`` members of an 'or' group on the same field
+        collapse into one set lookup, as do ``not_equals`` members of an
+        'and' group, and ``contains`` or ``regex`` members of an 'or' group
+        on the same field into one regex alternation.
+        """
+        set_operator = {'or': 'equals', 'and': 'not_equals'}.get(operator)
+        if set_operator is not None:
+            sub_conditions = list(self._flatten_group(operator, sub_conditions))
+        members = []  # (cost, position, predicate)
+        # (leaf operator, field) -> [(position, expected value, predicate)]
+        merged: Dict[Tuple[str, str], List[Tuple[int, Any, Callable]]] = {}
+        
+        for position, sub_condition in enumerate(sub_conditions):
+            predicate = self._compile(sub_condition)
+            if set_operator is not None and 'conditions' not in sub_condition:
+                leaf_operator = sub_condition.get('operator')
+                if (
+                    (leaf_operator == set_operator and self._is_set_value(sub_condition.get('value')))
+                    or (leaf_operator in ('contains', 'regex') and operator == 'or')
+                ):
+                    merged.setdefault((leaf_operator, sub_condition['field']), []).append(
+                        (position, sub_condition.get('value'), predicate)
+                    )
+                    continue
+            members.append((self._condition_cost(sub_condition), position, predicate))
+        
+        for (leaf_operator, field_path), field_members in merged.items():
+            position = field_members[0][0]
+            values = [value for _, value, _ in field_members]
+            if len(field_members) == 1:
+                predicate = field_members[0][2]
+            elif leaf_operator == 'contains':
+                predicate = self._compile_any_substring(field_path, values)
+            elif leaf_operator == 'regex':
+                predicate = self._compile_any_regex(field_path, values)
+                if predicate is None:
+                    members.extend(
+                        (self.OPERATOR_COSTS[leaf_operator], member_position, member_predicate)
+                        for member_position, _, member_predicate in field_members
+                    )
+                    continue
+            else:
+                predicate = self._compile_membership(field_path, values, negate=operator == 'and')
+            members.append((self.OPERATOR_COSTS[leaf_operator], position, predicate))
+        
+        members.sort(key=lambda member: member[:2])
+        return [predicate for _, _, predicate in members]
+    
+    def _flatten_group(self, operator: str, sub_conditions):
+        """Yield the members of a group, expanding nested groups with the same operator"""
+        for sub_condition in sub_conditions:
+            if (
+                isinstance(sub_condition, dict)
+                and 'conditions' in sub_condition
+                and sub_condition.get('operator', 'and') == operator
+            ):
+                yield from self._flatten_group(operator, sub_condition['conditions'])
+            else:
+                yield sub_condition
+    
+    def _is_set_value(self, value) -> bool:
+        """Whether set membership tests agree with == for this expected value"""
+        try:
+            hash(value)
+        except TypeError:
+            return False
+        # NaN is never == itself, but would be found in a set by identity
+        return value == value
+    
+    def _compile_any_substring(self, field_path: str, values: List[Any]) -> Callable[[Any, Dict[str, Any]], bool]:
+        """
+        Compile ``field contains v1 or field contains v2 ...`` into one search
+        for an alternation of the escaped needles, a single scan of the value.
+        """
+        pattern = re.compile('|'.join(re.escape(str(value)) for value in values))
+        lookup = self._compile_lookup(field_path)
+        return lambda transaction, metadata: pattern.search(str(lookup(transaction, metadata))) is not None
+    
+    def _compile_any_regex(self, field_path: str, values: List[Any]) -> Optional[Callable[[Any, Dict[str, Any]], bool]]:
+        """
+        Compile ``field regex p1 or field regex p2 ...`` into one search for
+        ``(?:p1)|(?:p2)|...``, or return None when the patterns cannot be
+        combined without changing their meaning.
+        """
+        patterns = [str(value) for value in values]
+        # Groups would be renumbered, breaking backreferences
+        if any(self._get_regex(pattern).groups for pattern in patterns):
+            return None
+        try:
+            combined = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+        except re.error:
+            # e.g. inline global flags, which are only valid at the start
+            return None
+        
+        lookup = self._compile_lookup(field_path)
+        return lambda transaction, metadata: combined.search(str(lookup(transaction, metadata))) is not None
+    
+    def _compile_lookup(self, field_path: str) -> Callable[[Any, Dict[str, Any]], Any]:
+        """Compile the field lookup a leaf condition performs"""
+        if field_path.startswith('metadata.'):
+            field_name = field_path[9:]  # Remove 'metadata.' prefix
+            return lambda transaction, metadata: metadata.get(field_name)
+        return lambda transaction, metadata: getattr(transaction, field_path, None)
+    
+    def _compile_membership(self, field_path: str, values: List[Any], negate: bool) -> Callable[[Any, Dict[str, Any]], bool]:
+        """
+        Compile ``field == v1 or field == v2 ...`` (or, with negate, the
+        ``field != v1 and field != v2 ...`` form) into one set lookup.
+        """
+        members = frozenset(values)
+        lookup = self._compile_lookup(field_path)
+        
+        def membership(transaction, metadata):
+            actual = lookup(transaction, metadata)
+            try:
+                found = actual in members
+            except TypeError:
+                # Unhashable field value: compare one by one
+                found = any(actual == value for value in values)
+            return not found if negate else found
+        return membership
+    
+    def _condition_cost(self, condition: Dict[str, Any]) -> int:
+        """Rough evaluation cost of a condition: its leaf operator costs, summed"""
         if 'conditions' in condition:
-            # Handle nested conditions
+            return sum(self._condition_cost(sub_condition) for sub_condition in condition['conditions'])
+        return self.OPERATOR_COSTS.get(condition.get('operator'), 1)
+    
+    def _compile_comparison(self, operator: str, expected) -> Callable[[Any], bool]:
+        """Compiled form of _compare_values() for a fixed operator and expected value"""
+        if operator == 'equals':
+            return lambda actual: actual == expected
+        elif operator == 'not_equals':
+            return lambda actual: actual != expected
+        elif operator in ('greater_than', 'less_than'):
+            expected_str = str(expected)
+            try:
+                expected_num = float(expected)
+            except (ValueError, TypeError):
+                # Every comparison falls back to strings
+                if operator == 'greater_than':
+                    return lambda actual: str(actual) > expected_str
+                return lambda actual: str(actual) < expected_str
+            
+            # Inputs that float() is known to reject go straight to the string
+            # comparison instead of raising and catching an exception
+            if operator == 'greater_than':
+                none_result = 'None' > expected_str
+                
+                def compare(actual):
+                    if actual is None:
+                        return none_result
+                    if actual.__class__ is str and not _may_be_float(actual):
+                        return actual > expected_str
+                    try:
+                        return float(actual) > expected_num
+                    except (ValueError, TypeError):
+                        return str(actual) > expected_str
+            else:
+                none_result = 'None' < expected_str
+                
+                def compare(actual):
+                    if actual is None:
+                        return none_result
+                    if actual.__class__ is str and not _may_be_float(actual):
+                        return actual < expected_str
+                    try:
+                        return float(actual) < expected_num
+                    except (ValueError, TypeError):
+                        return str(actual) < expected_str
+            return compare
+        elif operator == 'contains':
+            needle = str(expected)
+            return lambda actual: needle in str(actual)
+        elif operator == 'regex':
+            pattern = self._get_regex(str(expected))
+            return lambda actual: bool(pattern.search(str(actual)))
+        else:
+            return lambda actual: False
+    
+    def _walk_condition(self, transaction, metadata: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+        """Interpret a condition directly; used when it cannot be compiled"""
+        if 'conditions' in condition:
+            # Handle nested conditions, stopping at the first sub-condition
+            # that decides the result
             operator = condition.get('operator', 'and')
-            results = [
-                self._evaluate_condition(transaction, metadata, sub_condition)
+            results = (
+                self._walk_condition(transaction, metadata, sub_condition)
                 for sub_condition in condition['conditions']
-            ]
+            )
             
             if operator == 'and':
                 return all(results)
@@ -171,9 +576,20 @@ class ConditionalRuleProcessor(BaseRuleProcessor):
         elif operator == 'contains':
             return str(expected) in str(actual)
         elif operator == 'regex':
-            return bool(re.search(str(expected), str(actual)))
+            return bool(self._get_regex(str(expected)).search(str(actual)))
         else:
             return False
+    
+    def _get_regex(self, pattern: str) -> re.Pattern:
+        """Return the compiled regex for a pattern, compiling it on first use"""
+        compiled = self._regex_cache.get(pattern)
+        if compiled is None:
+            compiled = re.compile(pattern)
+            if len(self._regex_cache) >= self.REGEX_CACHE_SIZE:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self._regex_cache[next(iter(self._regex_cache))]
+            self._regex_cache[pattern] = compiled
+        return compiled
 
 
 class CelRuleProcessor(BaseRuleProcessor):
@@ -205,34 +621,551 @@ class CelRuleProcessor(BaseRuleProcessor):
     }
     """
     
+    # Upper bound on cached programs so frequently edited rules cannot grow
+    # the cache without limit
+    PROGRAM_CACHE_SIZE = 1024
+    
+    # Context entries that are only built for expressions that reference them
+    LAZY_CONTEXT_NAMES = frozenset({'transaction', 'metadata', 'now'})
+    
     def __init__(self):
         # Initialize CEL environment  
         self.env = celpy.Environment()
+        # expression -> (compiled program, LAZY_CONTEXT_NAMES it references,
+        # native closure from _compile_native() or None)
+        self._program_cache: Dict[str, Tuple[Any, frozenset, Optional[Callable]]] = {}
+        # expression -> error raised when compiling it
+        self._compile_errors: Dict[str, Exception] = {}
     
-    def process(self, transaction, metadata: Dict[str, Any], rule_config: Dict[str, Any]) -> Optional[str]:
+    def _get_program(self, expression: str) -> Tuple[Any, frozenset, Optional[Callable]]:
+        """Return the compiled CEL program for an expression, compiling it on first use"""
+        entry = self._program_cache.get(expression)
+        if entry is None:
+            error = self._compile_errors.get(expression)
+            if error is not None:
+                # Known-invalid expression: skip the parser
+                raise error.with_traceback(None)
+            try:
+                ast = self.env.compile(expression)
+            except Exception as e:
+                if len(self._compile_errors) >= self.PROGRAM_CACHE_SIZE:
+                    del self._compile_errors[next(iter(self._compile_errors))]
+                self._compile_errors[expression] = e
+                raise
+            names = frozenset(
+                str(subtree.children[0])
+                for subtree in ast.iter_subtrees()
+                if subtree.data == 'ident'
+            ) & self.LAZY_CONTEXT_NAMES
+            entry = (self.env.program(ast), names, self._compile_native(ast))
+            if len(self._program_cache) >= self.PROGRAM_CACHE_SIZE:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self._program_cache[next(iter(self._program_cache))]
+            self._program_cache[expression] = entry
+        return entry
+    
+    def _evaluate(self, expression: str, context: Dict[str, Any]):
+        """
+        Evaluate an expression, preferring its native closure and adding
+        context entries only when the expression references them.
+        """
+        program, names, native = self._get_program(expression)
+        for name in names:
+            if name not in context:
+                self._add_to_context(context, name)
+        if native is not None:
+            try:
+                return native(context)
+            except _NotNative:
+                pass
+        return program.evaluate(context)
+    
+    def _add_to_context(self, context: Dict[str, Any], name: str):
+        """Convert one of LAZY_CONTEXT_NAMES into the context"""
+        if name == 'now':
+            context['now'] = celpy.json_to_cel(timezone.now().isoformat())
+            return
+        if not isinstance(context, _CelContext):
+            # Caller-built contexts supply their own transaction/metadata
+            return
+        
         try:
-            # Prepare the evaluation context using celpy's json_to_cel conversion
-            context = {
-                'transaction': celpy.json_to_cel({
+            if name == 'transaction':
+                transaction = context.transaction
+                context['transaction'] = celpy.json_to_cel({
                     'product_code': transaction.product_code,
                     'produce_rate': float(transaction.produce_rate),
                     'ledger_type': transaction.ledger_type,
                     'source': transaction.source,
                     'jurisdiction': transaction.jurisdiction,
                     'created_at': transaction.created_at.isoformat() if hasattr(transaction.created_at, 'isoformat') else str(transaction.created_at),
-                }),
-                'metadata': celpy.json_to_cel(metadata),
-                # Add some utility values
-                'now': celpy.json_to_cel(timezone.now().isoformat()),
-            }
+                })
+            else:
+                context['metadata'] = celpy.json_to_cel(context.metadata)
+        except Exception as e:
+            raise _CelContextError(str(e)) from e
+    
+    # Parse tree nodes that only wrap a single child when no operator is used
+    _NATIVE_PASSTHROUGH = frozenset({
+        'expr', 'conditionalor', 'conditionaland', 'relation',
+        'addition', 'multiplication', 'unary', 'member', 'primary',
+    })
+    _NATIVE_RELATIONS = {
+        'relation_eq': lambda left, right: left == right,
+        'relation_ne': lambda left, right: left != right,
+        'relation_lt': lambda left, right: left < right,
+        'relation_le': lambda left, right: left <= right,
+        'relation_gt': lambda left, right: left > right,
+        'relation_ge': lambda left, right: left >= right,
+    }
+    _NATIVE_COMPARABLE = (celtypes.StringType, celtypes.DoubleType, celtypes.IntType)
+    _NATIVE_EQUATABLE = _NATIVE_COMPARABLE + (celtypes.BoolType,)
+    # Extra cost of string methods over a plain node, for operand ordering
+    _NATIVE_METHOD_COSTS = {'startsWith': 2, 'endsWith': 2, 'contains': 4, 'matches': 10}
+    _NATIVE_STRING_METHODS = {
+        'startsWith': str.startswith,
+        'endsWith': str.endswith,
+        'contains': str.__contains__,
+    }
+    
+    def _compile_native(self, ast) -> Optional[Callable[[Dict[str, Any]], Any]]:
+        """
+        Compile a CEL parse tree into a Python closure, or return None when the
+        expression uses anything outside the supported subset.
+        
+        The subset covers transaction/metadata field access, literals, ==, !=,
+        ordering, &&, ||, !, ternaries, has(), double(), ``in`` against a
+        literal list and the startsWith/endsWith/contains/matches string
+        methods. Constant subtrees are evaluated once at compile time, literal
+        lists become sets and literal patterns are checked up front.
+        
+        The closure returns the same celtypes values as celpy and raises
+        _NotNative whenever its operands are not ones whose semantics match
+        plain Python (mixed types, non-bool conditions, missing keys);
+        _evaluate() then runs the celpy program so CEL's own result or error
+        is kept.
+        """
+        try:
+            return self._native(ast)
+        except Exception:
+            # Unsupported syntax, or a literal celpy only rejects at runtime
+            return None
+    
+    def _native(self, tree) -> Callable[[Dict[str, Any]], Any]:
+        # Subtrees that never read the context are evaluated once here
+        if tree.data != 'literal':
+            is_constant, value = self._native_constant(tree)
+            if is_constant:
+                return lambda context: value
+        return self._native_node(tree)
+    
+    def _native_fuse_affixes(self, operand_trees, costed) -> List[Any]:
+        """
+        Fuse ``x.startsWith('a') || x.startsWith('b') || ...`` operands of an
+        || chain into one str.startswith(('a', 'b', ...)) closure, and the
+        same for endsWith.
+        
+        Fused closures are appended to ``costed`` as (cost, closure) pairs;
+        the operand trees that were not fused are returned.
+        """
+        groups: Dict[Tuple[str, Any], List[Tuple[Any, Any]]] = {}
+        remaining = []
+        for operand in operand_trees:
+            call = operand
+            while call.data in self._NATIVE_PASSTHROUGH and len(call.children) == 1:
+                call = call.children[0]
+            if (
+                call.data == 'member_dot_arg' and len(call.children) == 3
+                and str(call.children[1]) in ('startsWith', 'endsWith')
+                and len(call.children[2].children) == 1
+            ):
+                is_constant, affix = self._native_constant(call.children[2].children[0])
+                if is_constant and affix.__class__ is celtypes.StringType:
+                    key = (str(call.children[1]), call.children[0])
+                    groups.setdefault(key, []).append((operand, affix))
+                    continue
+            remaining.append(operand)
+        
+        for (method_name, target_tree), members in groups.items():
+            if len(members) == 1:
+                remaining.append(members[0][0])
+                continue
+            
+            target = self._native(target_tree)
+            affixes = tuple(str(affix) for _, affix in members)
+            method = str.startswith if method_name == 'startsWith' else str.endswith
+            
+            def any_affix(context, target=target, affixes=affixes, method=method):
+                value = target(context)
+                if value.__class__ is not celtypes.StringType:
+                    raise _NotNative
+                return _CEL_TRUE if method(value, affixes) else _CEL_FALSE
+            costed.append((self._native_cost(members[0][0]), any_affix))
+        
+        return remaining
+    
+    def _native_cost(self, tree) -> int:
+        """Rough static evaluation cost of a subtree, used to order && and || operands"""
+        cost = 0
+        for subtree in tree.iter_subtrees():
+            cost += 1
+            if subtree.data == 'member_dot_arg':
+                cost += self._NATIVE_METHOD_COSTS.get(str(subtree.children[1]), 5)
+        return cost
+    
+    def _native_constant(self, tree) -> Tuple[bool, Any]:
+        """Return (True, value) for a subtree whose value does not depend on the context"""
+        if any(subtree.data == 'ident' for subtree in tree.iter_subtrees()):
+            return False, None
+        try:
+            return True, self._native_node(tree)({})
+        except _NotNative:
+            return False, None
+    
+    def _native_node(self, tree) -> Callable[[Dict[str, Any]], Any]:
+        data = tree.data
+        children = tree.children
+        
+        if data in self._NATIVE_PASSTHROUGH and len(children) == 1:
+            return self._native(children[0])
+        
+        if data == 'expr' and len(children) == 3:
+            condition, if_true, if_false = (self._native(child) for child in children)
+            
+            def ternary(context):
+                result = condition(context)
+                if result.__class__ is not celtypes.BoolType:
+                    raise _NotNative
+                return if_true(context) if result else if_false(context)
+            return ternary
+        
+        if data in ('conditionalor', 'conditionaland') and len(children) == 2:
+            # Flatten the left-nested chain; CEL's && and || are commutative
+            # and side-effect free, so operands can run cheapest first
+            operand_trees = []
+            node = tree
+            while node.data == data and len(node.children) == 2:
+                operand_trees.append(node.children[1])
+                node = node.children[0]
+            operand_trees.append(node)
+            # && stops on false, || stops on true
+            stop = data == 'conditionalor'
+            
+            costed = []
+            if stop:
+                operand_trees = self._native_fuse_affixes(operand_trees, costed)
+            costed.extend((self._native_cost(operand), self._native(operand)) for operand in operand_trees)
+            costed.sort(key=lambda item: item[0])
+            operands = [operand for _, operand in costed]
+            
+            def logical(context):
+                decided = True
+                for operand in operands:
+                    try:
+                        result = operand(context)
+                    except _NotNative:
+                        result = None
+                    if result.__class__ is celtypes.BoolType:
+                        if bool(result) is stop:
+                            return result
+                    else:
+                        # An erroring or non-bool operand still loses to a
+                        # deciding one, so keep looking before giving up
+                        decided = False
+                if not decided:
+                    raise _NotNative
+                return _CEL_FALSE if stop else _CEL_TRUE
+            return logical
+        
+        if data == 'relation' and len(children) == 2 and children[0].data == 'relation_in':
+            # Membership in a literal list of same-typed constants becomes a
+            # prebuilt set lookup
+            container = children[1]
+            while container.data in self._NATIVE_PASSTHROUGH and len(container.children) == 1:
+                container = container.children[0]
+            if container.data != 'list_lit' or not container.children:
+                raise _NotNative
+            elements = []
+            for element in container.children[0].children:
+                is_constant, value = self._native_constant(element)
+                if not is_constant:
+                    raise _NotNative
+                elements.append(value)
+            element_class = elements[0].__class__
+            if element_class not in self._NATIVE_COMPARABLE or any(
+                element.__class__ is not element_class for element in elements
+            ):
+                raise _NotNative
+            members = frozenset(elements)
+            item = self._native(children[0].children[0])
+            
+            def membership(context):
+                value = item(context)
+                if value.__class__ is not element_class:
+                    raise _NotNative
+                return _CEL_TRUE if value in members else _CEL_FALSE
+            return membership
+        
+        if data == 'relation' and len(children) == 2:
+            operator = self._NATIVE_RELATIONS.get(children[0].data)
+            if operator is None or len(children[0].children) != 1:
+                raise _NotNative
+            left, right = self._native(children[0].children[0]), self._native(children[1])
+            if children[0].data in ('relation_eq', 'relation_ne'):
+                comparable = self._NATIVE_EQUATABLE
+            else:
+                comparable = self._NATIVE_COMPARABLE
+            
+            def relation(context):
+                left_value = left(context)
+                right_value = right(context)
+                # Only same-typed values compare like Python
+                if left_value.__class__ is not right_value.__class__ or not isinstance(left_value, comparable):
+                    raise _NotNative
+                return _CEL_TRUE if operator(left_value, right_value) else _CEL_FALSE
+            return relation
+        
+        if data == 'unary' and len(children) == 2 and children[0].data == 'unary_not':
+            operand = self._native(children[1])
             
+            def negate(context):
+                result = operand(context)
+                if result.__class__ is not celtypes.BoolType:
+                    raise _NotNative
+                return _CEL_FALSE if result else _CEL_TRUE
+            return negate
+        
+        if data == 'member_dot':
+            field_name = str(children[1])
+            missing = object()
+            
+            root = children[0]
+            while root.data in self._NATIVE_PASSTHROUGH and len(root.children) == 1:
+                root = root.children[0]
+            if root.data == 'ident' and root.children[0] in ('transaction', 'metadata'):
+                # transaction.X / metadata.X resolve in one closure, with
+                # plain dict lookups rather than MapType.__getitem__
+                root_name = str(root.children[0])
+                
+                def root_member(context):
+                    mapping = context.get(root_name)
+                    if mapping.__class__ is not celtypes.MapType:
+                        raise _NotNative
+                    value = mapping.get(field_name, missing)
+                    if value is missing:
+                        raise _NotNative
+                    return value
+                return root_member
+            
+            target = self._native(children[0])
+            
+            def member(context):
+                mapping = target(context)
+                if mapping.__class__ is not celtypes.MapType:
+                    raise _NotNative
+                value = mapping.get(field_name, missing)
+                if value is missing:
+                    raise _NotNative
+                return value
+            return member
+        
+        if data == 'member_dot_arg' and len(children) == 3:
+            method_name = str(children[1])
+            method = self._NATIVE_STRING_METHODS.get(method_name)
+            arguments = children[2].children
+            if len(arguments) != 1 or (method is None and method_name != 'matches'):
+                raise _NotNative
+            target = self._native(children[0])
+            
+            is_constant, other = self._native_constant(arguments[0])
+            if is_constant and other.__class__ is celtypes.StringType:
+                # Literal argument: bind it. matches() goes through celpy's
+                # own implementation so the regex engine is whichever one the
+                # installed celpy uses; patterns it rejects stay with celpy,
+                # which reports the error
+                if method is None:
+                    if function_matches('', other).__class__ is not celtypes.BoolType:
+                        raise _NotNative
+                    
+                    def test(value):
+                        result = function_matches(value, other)
+                        if result.__class__ is not celtypes.BoolType:
+                            raise _NotNative
+                        return result
+                else:
+                    test = lambda value: method(value, other)
+                
+                def constant_string_method(context):
+                    value = target(context)
+                    if value.__class__ is not celtypes.StringType:
+                        raise _NotNative
+                    return _CEL_TRUE if test(value) else _CEL_FALSE
+                return constant_string_method
+            
+            if method is None:
+                raise _NotNative
+            argument = self._native(arguments[0])
+            
+            def string_method(context):
+                value = target(context)
+                other = argument(context)
+                if value.__class__ is not celtypes.StringType or other.__class__ is not celtypes.StringType:
+                    raise _NotNative
+                return _CEL_TRUE if method(value, other) else _CEL_FALSE
+            return string_method
+        
+        if data == 'ident':
+            name = str(children[0])
+            if name not in ('transaction', 'metadata'):
+                raise _NotNative
+            
+            def identifier(context):
+                value = context.get(name)
+                if value is None:
+                    raise _NotNative
+                return value
+            return identifier
+        
+        if data == 'paren_expr':
+            return self._native(children[0])
+        
+        if data == 'literal':
+            token = children[0]
+            if token.type == 'FLOAT_LIT':
+                value = celtypes.DoubleType(token.value)
+            elif token.type == 'INT_LIT':
+                value = celtypes.IntType(token.value)
+            elif token.type in ('MLSTRING_LIT', 'STRING_LIT'):
+                value = celstr(token)
+            elif token.type == 'BOOL_LIT':
+                value = _CEL_TRUE if token.value.lower() == 'true' else _CEL_FALSE
+            elif token.type == 'NULL_LIT':
+                value = None
+            else:
+                raise _NotNative
+            return lambda context: value
+        
+        if data == 'ident_arg' and len(children) == 2 and len(children[1].children) == 1:
+            function_name = str(children[0])
+            argument = children[1].children[0]
+            
+            if function_name == 'has':
+                # has() takes a field selection, not a value
+                while argument.data in self._NATIVE_PASSTHROUGH and len(argument.children) == 1:
+                    argument = argument.children[0]
+                if argument.data != 'member_dot':
+                    raise _NotNative
+                target, field_name = self._native(argument.children[0]), str(argument.children[1])
+                
+                def has(context):
+                    mapping = target(context)
+                    if mapping.__class__ is not celtypes.MapType:
+                        raise _NotNative
+                    return _CEL_TRUE if field_name in mapping else _CEL_FALSE
+                return has
+            
+            if function_name == 'double':
+                operand = self._native(argument)
+                
+                def to_double(context):
+                    value = operand(context)
+                    if value.__class__ is celtypes.DoubleType:
+                        return value
+                    if value.__class__ is celtypes.IntType:
+                        return celtypes.DoubleType(value)
+                    raise _NotNative
+                return to_double
+        
+        raise _NotNative
+    
+    def process(self, transaction, metadata: Dict[str, Any], rule_config: Dict[str, Any]) -> Optional[str]:
+        try:
+            context = self.build_context(transaction, metadata)
+        except Exception as e:
+            self._log_evaluation_error(e, rule_config)
+            return None
+        
+        return self.process_with_context(context, rule_config)
+    
+    def build_context(self, transaction, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the CEL evaluation context for a transaction.
+        
+        The context only depends on the transaction and its metadata, so
+        callers evaluating several rules against one transaction can build it
+        once and pass it to process_with_context(). Its 'transaction',
+        'metadata' and 'now' entries are converted with celpy's json_to_cel
+        by _evaluate(), the first time an expression references them.
+        
+        Args:
+            transaction: Transaction instance
+            metadata: Transaction metadata
+            
+        Returns:
+            Dict[str, Any]: CEL activation mapping
+        """
+        return _CelContext(transaction, metadata)
+    
+    def replace_context_metadata(self, context: Dict[str, Any], metadata: Dict[str, Any]):
+        """Point a context from build_context() at different metadata"""
+        context.metadata = metadata
+        context.pop('metadata', None)
+    
+    def prepare(self, rule_config: Dict[str, Any]) -> Optional[frozenset]:
+        """
+        Compile every expression a rule config will evaluate, ahead of use.
+        
+        The fused program of a conditions list is not built here: that is
+        _fused_conditions(), which AutoTagEngine calls once per rule load and
+        again whenever the company's rule version changes.
+        
+        Returns:
+            The LAZY_CONTEXT_NAMES the rule's expressions reference, or None
+            when they cannot be determined (legacy scripts, invalid configs)
+        """
+        try:
+            if 'expression' in rule_config:
+                expressions = [rule_config.get('expression', '')]
+            elif 'conditions' in rule_config:
+                conditions = rule_config.get('conditions', [])
+                expressions = [
+                    condition.get('expression', '')
+                    for condition in conditions
+                    if condition.get('tag')
+                ]
+            elif 'script' in rule_config:
+                return None
+            else:
+                return frozenset()
+            
+            names = frozenset()
+            for expression in expressions:
+                if expression:
+                    names |= self._get_program(expression)[1]
+            return names
+        except Exception:
+            return None
+    
+    def process_with_context(
+        self,
+        context: Dict[str, Any],
+        rule_config: Dict[str, Any],
+        fused: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Evaluate a rule against a context from build_context().
+        
+        ``fused`` is the rule's conditions list as one expression, from
+        _fused_conditions(); without it conditions are evaluated one by one.
+        """
+        try:
             # Check for single expression mode
             if 'expression' in rule_config:
                 return self._evaluate_single_expression(rule_config, context)
             
             # Check for multiple conditions mode
             if 'conditions' in rule_config:
-                return self._evaluate_conditions(rule_config, context)
+                return self._evaluate_conditions(rule_config, context, fused)
             
             # Legacy support for 'script' key - treat as expression
             if 'script' in rule_config:
@@ -254,19 +1187,27 @@ class CelRuleProcessor(BaseRuleProcessor):
                     return None
                 
             return None
+        
+        except _CelContextError as e:
+            # The transaction or metadata could not be converted to CEL
+            self._log_evaluation_error(e.__cause__, rule_config)
+            return None
             
         except Exception as e:
-            security_logger.error(
-                "CEL expression evaluation error",
-                extra={
-                    'error': str(e),
-                    'error_type': type(e).__name__,
-                    'rule_config': str(rule_config)[:200],  # Truncate for logging
-                    'event_type': 'cel_evaluation_error'
-                }
-            )
+            self._log_evaluation_error(e, rule_config)
             return None
     
+    def _log_evaluation_error(self, error: Exception, rule_config: Dict[str, Any]):
+        security_logger.error(
+            "CEL expression evaluation error",
+            extra={
+                'error': str(error),
+                'error_type': type(error).__name__,
+                'rule_config': str(rule_config)[:200],  # Truncate for logging
+                'event_type': 'cel_evaluation_error'
+            }
+        )
+    
     def _evaluate_single_expression(self, rule_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[str]:
         """Evaluate a single CEL expression that should return a tag or null"""
         expression = rule_config.get('expression', '')
@@ -276,10 +1217,8 @@ class CelRuleProcessor(BaseRuleProcessor):
             return default_tag
             
         try:
-            # Compile and evaluate the CEL expression
-            ast = self.env.compile(expression)
-            program = self.env.program(ast)
-            result = program.evaluate(context)
+            # Evaluate the (cached) compiled CEL expression
+            result = self._evaluate(expression, context)
             
             # Convert CEL result back to Python and return if it's a non-empty string
             if hasattr(result, 'value'):
@@ -290,6 +1229,9 @@ class CelRuleProcessor(BaseRuleProcessor):
             if isinstance(result_value, str) and result_value.strip():
                 return result_value
             return default_tag
+        
+        except _CelContextError:
+            raise
             
         except Exception as e:
             security_logger.warning(
@@ -302,11 +1244,68 @@ class CelRuleProcessor(BaseRuleProcessor):
             )
             return default_tag
     
-    def _evaluate_conditions(self, rule_config: Dict[str, Any], context: Dict[str, Any]) -> Optional[str]:
+    def _fused_conditions(self, conditions) -> Optional[str]:
+        """
+        Return one chained-ternary CEL expression equivalent to a conditions
+        list, or None when the list cannot be fused.
+        
+        ``[{expression: c1, tag: t1}, {expression: c2, tag: t2}]`` becomes
+        ``(c1) ? "t1" : ((c2) ? "t2" : (null))``. The result is not cached:
+        AutoTagEngine fuses each rule once when it loads the company's rules,
+        and reloads them when a rule changes.
+        """
+        fused = None
+        try:
+            branches = [
+                (condition.get('expression', ''), condition.get('tag'))
+                for condition in conditions
+            ]
+            branches = [(expression, tag) for expression, tag in branches if expression and tag]
+            if all(isinstance(tag, str) for _, tag in branches):
+                # Only fuse expressions that are valid on their own, so the
+                # parentheses below cannot change how any of them parses
+                for expression, _ in branches:
+                    self._get_program(expression)
+                
+                fused = 'null'
+                for expression, tag in reversed(branches):
+                    # Newline before ')' so a trailing // comment cannot
+                    # swallow the rest of the chain
+                    fused = f"({expression}\n) ? {json.dumps(tag, ensure_ascii=False)} : ({fused})"
+                self._get_program(fused)
+        except Exception:
+            fused = None
+        return fused
+    
+    def _evaluate_conditions(
+        self,
+        rule_config: Dict[str, Any],
+        context: Dict[str, Any],
+        fused: Optional[str] = None
+    ) -> Optional[str]:
         """Evaluate multiple CEL conditions and return the first matching tag"""
         conditions = rule_config.get('conditions', [])
         default_tag = rule_config.get('default_tag')
         
+        if not conditions:
+            return default_tag
+        
+        # Try all conditions as a single program first. Non-boolean results
+        # or errors make CEL's ternary fail, in which case the conditions are
+        # evaluated one by one below, with the usual per-condition logging.
+        if fused is not None:
+            try:
+                result = self._evaluate(fused, context)
+            except _CelContextError:
+                raise
+            except Exception:
+                pass
+            else:
+                if result is None:
+                    return default_tag
+                if isinstance(result, str):
+                    return str(result)
+        
         for condition in conditions:
             expression = condition.get('expression', '')
             tag = condition.get('tag')
@@ -315,10 +1314,8 @@ class CelRuleProcessor(BaseRuleProcessor):
                 continue
                 
             try:
-                # Compile and evaluate the CEL expression  
-                ast = self.env.compile(expression)
-                program = self.env.program(ast)
-                result = program.evaluate(context)
+                # Evaluate the (cached) compiled CEL expression
+                result = self._evaluate(expression, context)
                 
                 # Convert CEL result back to Python
                 if hasattr(result, 'value'):
@@ -329,6 +1326,9 @@ class CelRuleProcessor(BaseRuleProcessor):
                 # If the condition evaluates to true, return the tag
                 if result_value:
                     return tag
+            
+            except _CelContextError:
+                raise
                     
             except Exception as e:
                 security_logger.warning(
@@ -375,87 +1375,376 @@ class AutoTagEngine:
     Main engine that orchestrates the tagging process.
     """
     
+    # One CEL processor serves both rule types so they share its program cache
+    _cel_processor = CelRuleProcessor()
+    
     PROCESSORS = {
         'simple': SimpleRuleProcessor(),
         'conditional': ConditionalRuleProcessor(),
-        'script': CelRuleProcessor(),  # Now uses CEL instead of Python
-        'cel': CelRuleProcessor(),     # Direct CEL access
+        'script': _cel_processor,  # Now uses CEL instead of Python
+        'cel': _cel_processor,     # Direct CEL access
         'ml': MLRuleProcessor(),
     }
     
-    def tag_transaction(self, transaction, company) -> Optional[str]:
+    # Rows per INSERT ... ON CONFLICT statement in persist_tags()
+    PERSIST_BATCH_SIZE = 500
+    
+    # Seconds a company's cached active rules stay valid. Rule changes in
+    # this process invalidate immediately through invalidate_rules(); the
+    # TTL bounds staleness for edits made elsewhere (other processes,
+    # queryset.update()).
+    RULES_CACHE_TTL = 60.0
+    
+    # company id -> rule version, bumped whenever one of its rules changes.
+    # Shared by every engine in the process.
+    _rule_versions: Dict[int, int] = {}
+    
+    def __init__(self):
+        # company id -> (load time, rule version, active rules, simple-rule index)
+        self._rules_cache: Dict[int, Tuple[float, int, List[Any], Dict[str, Any]]] = {}
+    
+    @classmethod
+    def invalidate_rules(cls, company_id: int):
+        """Mark a company's cached rules stale in every engine of this process"""
+        cls._rule_versions[company_id] = cls._rule_versions.get(company_id, 0) + 1
+    
+    def get_active_rules(self, company) -> Tuple[List[Any], Dict[str, Any]]:
+        """
+        Return the company's active rules ordered by priority, with their
+        simple-rule index, reusing them until the rules change or for up to
+        RULES_CACHE_TTL seconds.
+        
+        Args:
+            company: Company instance
+            
+        Returns:
+            Tuple of (rules, SimpleRuleProcessor.build_index() result)
+        """
+        now = time.monotonic()
+        version = self._rule_versions.get(company.id, 0)
+        cached = self._rules_cache.get(company.id)
+        if cached is None or cached[1] != version or now - cached[0] > self.RULES_CACHE_TTL:
+            # Only the columns evaluation reads; created_at, updated_at and
+            # is_active stay deferred
+            rules = list(
+                company.tagging_rules.filter(
+                    is_active=True
+                ).only(
+                    'id', 'company', 'name', 'rule_type', 'priority', 'rule_config', 'conditions'
+                ).order_by('priority').iterator(chunk_size=200)
+            )
+            self._prepare_rules(rules)
+            simple_index = self.PROCESSORS['simple'].build_index(rules)
+            cached = self._rules_cache[company.id] = (now, version, rules, simple_index)
+        return cached[2], cached[3]
+    
+    def _prepare_rules(self, rules):
+        """
+        Attach per-rule evaluation data used by compute_tag():
+        ``_compiled_conditions`` holds the compiled rule-level conditions
+        (None when the rule has none), ``_compiled_rule`` the compiled
+        conditions list of a conditional rule (None when it has to be
+        interpreted), ``_fused_conditions`` the fused expression of a CEL
+        conditions list (None when it cannot be fused) and ``_uses_metadata``
+        tells whether evaluating the rule can read transaction metadata. CEL programs are compiled here as
+        well, so no transaction pays for compilation.
+        
+        Rules are prepared once per load in get_active_rules(); a rule change
+        bumps the company's rule version, which reloads and prepares again.
+        """
+        conditional = self.PROCESSORS['conditional']
+        for rule in rules:
+            rule._compiled_conditions = (
+                conditional._compile_condition(rule.conditions) if rule.conditions else None
+            )
+            rule._compiled_rule = None
+            rule._fused_conditions = None
+            if isinstance(rule.rule_config, dict):
+                if rule.rule_type == 'conditional':
+                    rule._compiled_rule = conditional.compile_conditions(rule.rule_config.get('conditions', []))
+                elif (
+                    self.PROCESSORS.get(rule.rule_type) is self._cel_processor
+                    and 'expression' not in rule.rule_config
+                    and rule.rule_config.get('conditions')
+                ):
+                    rule._fused_conditions = self._cel_processor._fused_conditions(rule.rule_config['conditions'])
+            rule._uses_metadata = (
+                self._conditions_use_metadata(rule.conditions) or self._config_uses_metadata(rule)
+            )
+    
+    def _config_uses_metadata(self, rule) -> bool:
+        """Whether a rule's processor can read metadata; True when unsure"""
+        rule_config = rule.rule_config
+        if not isinstance(rule_config, dict):
+            return True
+        
+        if rule.rule_type == 'simple':
+            mappings = rule_config.get('mappings', {})
+            if not isinstance(mappings, dict):
+                return True
+            return any(
+                field_name not in SimpleRuleProcessor.TRANSACTION_FIELDS for field_name in mappings
+            )
+        
+        if rule.rule_type == 'conditional':
+            return self._conditions_use_metadata({'conditions': rule_config.get('conditions', [])})
+        
+        processor = self.PROCESSORS.get(rule.rule_type)
+        if isinstance(processor, CelRuleProcessor):
+            # Compiles the rule's programs now, ahead of the first transaction
+            names = processor.prepare(rule_config)
+            return names is None or 'metadata' in names
+        
+        return True
+    
+    def _conditions_use_metadata(self, conditions) -> bool:
+        """Whether a condition tree references a metadata field; True when unsure"""
+        if not conditions:
+            return False
+        if not isinstance(conditions, dict):
+            return True
+        
+        if 'conditions' in conditions:
+            sub_conditions = conditions['conditions']
+            if not isinstance(sub_conditions, list):
+                return True
+            return any(self._conditions_use_metadata(sub) or not isinstance(sub, dict) for sub in sub_conditions)
+        
+        field_path = conditions.get('field')
+        return not isinstance(field_path, str) or field_path.startswith('metadata.')
+    
+    def tag_transaction(self, transaction, company, rules=None, simple_index=None) -> Optional[str]:
         """
         Tag a transaction based on company rules.
         
         Args:
             transaction: Transaction instance
             company: Company instance
+            rules: Optional pre-fetched active rules ordered by priority;
+                fetched from the company when omitted
+            simple_index: Optional SimpleRuleProcessor.build_index() result
+                for ``rules``; indexed simple rules with no mapping key for
+                this transaction are skipped without being evaluated
             
         Returns:
             Optional[str]: Tag code or None
         """
-        from .models import TransactionTag
+        # Get company rules ordered by priority
+        if rules is None:
+            rules, simple_index = self.get_active_rules(company)
         
-        # Get metadata
-        metadata = {}
-        if hasattr(transaction, 'external_data'):
-            metadata = transaction.external_data.metadata
+        best_tag, best_confidence, processing_notes = self.compute_tag(
+            transaction, rules, simple_index
+        )
         
-        # Get company rules ordered by priority
-        rules = company.tagging_rules.filter(is_active=True).order_by('priority')
+        # Create or update the tag with a single upsert
+        if best_tag:
+            self.persist_tags(company, [(transaction, best_tag, best_confidence, processing_notes)])
+            return best_tag
+        
+        return None
+    
+    def tag_transactions(self, transactions, company) -> Dict[int, Optional[str]]:
+        """
+        Tag several transactions for one company and save the tags in bulk.
+        
+        Metadata for transactions whose external data is not already loaded
+        is fetched with a single query.
+        
+        Args:
+            transactions: Iterable of Transaction instances
+            company: Company instance
+            
+        Returns:
+            Dict mapping transaction ID to assigned tag (or None)
+        """
+        transactions = list(transactions)
+        rules, simple_index = self.get_active_rules(company)
+        
+        metadata_by_id = {}
+        missing_ids = [
+            transaction.id for transaction in transactions
+            if not Transaction.external_data.is_cached(transaction)
+        ]
+        if missing_ids:
+            metadata_by_id = dict(
+                ExternalData.objects.filter(
+                    transaction_id__in=missing_ids
+                ).values_list('transaction_id', 'metadata')
+            )
+        
+        results = {}
+        # Keyed by transaction id so a repeated transaction keeps its last
+        # result and the upsert never carries the same row twice
+        computed = {}
+        for transaction in transactions:
+            # None lets compute_tag read external data that is already loaded
+            metadata = None
+            if not Transaction.external_data.is_cached(transaction):
+                metadata = metadata_by_id.get(transaction.id) or {}
+            
+            tag_code, confidence, notes = self.compute_tag(
+                transaction, rules, simple_index, metadata=metadata
+            )
+            results[transaction.id] = tag_code
+            computed[transaction.id] = (transaction, tag_code, confidence, notes)
+        
+        self.persist_tags(company, computed.values())
+        return results
+    
+    def persist_tags(self, company, results) -> int:
+        """
+        Save computed tags with bulk upserts on (transaction, company).
+        
+        Args:
+            company: Company instance
+            results: Iterable of (transaction, tag_code, confidence, notes)
+                tuples as produced from compute_tag(); rows without a tag
+                are skipped
+            
+        Returns:
+            int: Number of tags written
+        """
+        now = timezone.now()
+        tags = [
+            TransactionTag(
+                transaction_id=transaction.id,
+                company=company,
+                tag_code=tag_code,
+                confidence_score=confidence,
+                processing_notes=notes,
+                created_at=now,
+                updated_at=now
+            )
+            for transaction, tag_code, confidence, notes in results
+            if tag_code
+        ]
+        
+        if tags:
+            TransactionTag.objects.bulk_create(
+                tags,
+                batch_size=self.PERSIST_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['transaction', 'company'],
+                update_fields=['tag_code', 'confidence_score', 'processing_notes', 'updated_at']
+            )
+        return len(tags)
+    
+    def compute_tag(self, transaction, rules, simple_index=None, metadata=None) -> Tuple[Optional[str], float, str]:
+        """
+        Evaluate rules against a transaction without saving anything.
+        
+        Args:
+            transaction: Transaction instance, or any object exposing the
+                transaction fields the rules read
+            rules: Active rules ordered by priority
+            simple_index: Optional SimpleRuleProcessor.build_index() result
+                built from this same ``rules`` sequence; only unindexed rules
+                and matching simple rules are visited
+            metadata: Optional pre-fetched metadata; read from
+                ``transaction.external_data`` when omitted
+            
+        Returns:
+            Tuple of (tag code or None, confidence score, processing notes)
+        """
+        # Metadata is read from external data only once a rule needs it, so
+        # transactions matched on transaction fields alone skip that lookup
+        metadata_loaded = metadata is not None
+        if not metadata_loaded:
+            metadata = {}
         
         best_tag = None
         best_confidence = 0.0
         processing_notes = []
         
+        if simple_index:
+            if not metadata_loaded and simple_index['metadata_fields']:
+                metadata = self._load_metadata(transaction)
+                metadata_loaded = True
+            
+            # Only unindexed rules and simple rules with a mapping key for this
+            # transaction can produce a tag; visit just those, in priority order.
+            # Metadata that is not a mapping, or a lookup that fails, visits
+            # every rule so the failure is recorded per rule below.
+            candidate_ids = None
+            if isinstance(metadata, dict):
+                try:
+                    candidate_ids = self.PROCESSORS['simple'].candidate_rule_ids(
+                        simple_index, transaction, metadata
+                    )
+                except Exception:
+                    candidate_ids = None
+            
+            if candidate_ids is not None:
+                positions = simple_index['positions']
+                candidate_positions = [positions[rule_id] for rule_id in candidate_ids]
+                rules = [rules[position] for position in sorted(simple_index['unindexed'] + candidate_positions)]
+        
+        # Built on the first CEL rule and shared by the rest for this transaction
+        cel_context = None
+        
+        # Bound once; the loop below runs for every candidate rule
+        processors = self.PROCESSORS
+        cel_processor = self._cel_processor
+        
         for rule in rules:
-            processor = self.PROCESSORS.get(rule.rule_type)
-            if not processor:
+            processor = processors.get(rule.rule_type)
+            if processor is None:
                 continue
             
-            # Check if rule conditions are met
-            if not self._check_rule_conditions(transaction, metadata, rule.conditions):
+            if not metadata_loaded and getattr(rule, '_uses_metadata', True):
+                metadata = self._load_metadata(transaction)
+                metadata_loaded = True
+                if cel_context is not None:
+                    # Built for an earlier rule that did not read metadata
+                    cel_processor.replace_context_metadata(cel_context, metadata)
+            
+            # Check if rule conditions are met, using the precompiled check
+            # when the rule was loaded through get_active_rules()
+            check_conditions = getattr(rule, '_compiled_conditions', _UNCOMPILED)
+            if check_conditions is _UNCOMPILED:
+                if not self._check_rule_conditions(transaction, metadata, rule.conditions):
+                    continue
+            elif check_conditions is not None and not check_conditions(transaction, metadata):
                 continue
             
             try:
-                tag_code = processor.process(transaction, metadata, rule.rule_config)
+                if processor is cel_processor:
+                    if cel_context is None:
+                        cel_context = cel_processor.build_context(transaction, metadata)
+                    tag_code = cel_processor.process_with_context(
+                        cel_context, rule.rule_config, getattr(rule, '_fused_conditions', None)
+                    )
+                elif getattr(rule, '_compiled_rule', None) is not None:
+                    tag_code = processor.process_compiled(rule._compiled_rule, transaction, metadata)
+                else:
+                    tag_code = processor.process(transaction, metadata, rule.rule_config)
                 
                 if tag_code:
-                    confidence = 1.0  # Default confidence, could be improved
-                    
-                    if confidence > best_confidence:
-                        best_tag = tag_code
-                        best_confidence = confidence
-                    
+                    best_tag = tag_code
+                    best_confidence = 1.0  # Default confidence, could be improved
                     processing_notes.append(f"Rule '{rule.name}' matched: {tag_code}")
                     
-                    # If this is a high-priority rule with high confidence, stop processing
-                    if rule.priority < 50 and confidence > 0.9:
-                        break
+                    # Every match has the same confidence, so no lower-priority
+                    # rule can replace the first one; stop processing
+                    break
                         
             except Exception as e:
                 processing_notes.append(f"Rule '{rule.name}' failed: {str(e)}")
         
-        # Create or update the tag
-        if best_tag:
-            tag, created = TransactionTag.objects.update_or_create(
-                transaction=transaction,
-                company=company,
-                defaults={
-                    'tag_code': best_tag,
-                    'confidence_score': best_confidence,
-                    'processing_notes': '\n'.join(processing_notes),
-                    'updated_at': timezone.now()
-                }
-            )
-            return best_tag
-        
-        return None
+        if best_tag is None:
+            return None, best_confidence, ''
+        return best_tag, best_confidence, '\n'.join(processing_notes)
+    
+    def _load_metadata(self, transaction) -> Dict[str, Any]:
+        """Return the transaction's external metadata, or {} when it has none"""
+        if hasattr(transaction, 'external_data'):
+            return transaction.external_data.metadata
+        return {}
     
     def _check_rule_conditions(self, transaction, metadata: Dict[str, Any], conditions: Dict[str, Any]) -> bool:
         """Check if rule-level conditions are met."""
         if not conditions:
             return True
         
-        processor = ConditionalRuleProcessor()
-        return processor._evaluate_condition(transaction, metadata, conditions)
\ No newline at end of file
+        return self.PROCESSORS['conditional']._evaluate_condition(transaction, metadata, conditions)
\ No newline at end of file
@@ -1,11 +1,16 @@
+from collections import namedtuple
 from typing import List, Optional, Dict, Any
 from django.db import transaction
 from django.db import models
 from .models import Company, TransactionTag, TaggingRule
-from .rule_engine import AutoTagEngine
+from .rule_engine import AutoTagEngine, SimpleRuleProcessor
 from transactions.models import Transaction
 
 
+# Lightweight transaction row carrying just the fields simple rules map on
+_SimpleRow = namedtuple('_SimpleRow', ('id',) + tuple(sorted(SimpleRuleProcessor.TRANSACTION_FIELDS)))
+
+
 class AutoTagService:
     """
     Service layer for auto-tagging operations.
@@ -57,23 +62,68 @@ class AutoTagService:
         except Company.DoesNotExist:
             return results
         
-        # Process in batches
+        rules, simple_index = self.engine.get_active_rules(company)
+        
+        # When every rule is an indexed simple mapping without rule-level
+        # conditions, only the mapped columns are ever read, so rows are
+        # fetched as plain tuples instead of model instances
+        columnar = all(
+            rule.id in simple_index['rule_ids'] and not rule.conditions
+            for rule in rules
+        )
+        
+        # Process in batches, joining external data so each transaction's
+        # metadata arrives with the batch instead of one query per row.
+        # Computed tags are written in bulk once enough have accumulated,
+        # keyed by transaction id: a repeated id keeps its last result, and
+        # one upsert statement never touches the same row twice.
+        pending = {}
         for i in range(0, len(transaction_ids), batch_size):
             batch_ids = transaction_ids[i:i + batch_size]
-            transactions = Transaction.objects.filter(id__in=batch_ids)
             
-            for transaction_obj in transactions:
-                tag_code = self.engine.tag_transaction(transaction_obj, company)
-                results[transaction_obj.id] = tag_code
+            if columnar:
+                rows = Transaction.objects.filter(
+                    id__in=batch_ids
+                ).values_list(*_SimpleRow._fields, 'external_data__metadata')
+                
+                for *values, metadata in rows.iterator(chunk_size=batch_size):
+                    row = _SimpleRow(*values)
+                    tag_code, confidence, notes = self.engine.compute_tag(
+                        row, rules, simple_index, metadata=metadata or {}
+                    )
+                    results[row.id] = tag_code
+                    if tag_code:
+                        pending[row.id] = (row, tag_code, confidence, notes)
+            else:
+                transactions = Transaction.objects.filter(
+                    id__in=batch_ids
+                ).select_related('external_data')
+                
+                # Stream rows through a cursor rather than caching the whole batch
+                # on the queryset; each row is only needed once
+                for transaction_obj in transactions.iterator(chunk_size=batch_size):
+                    tag_code, confidence, notes = self.engine.compute_tag(
+                        transaction_obj, rules, simple_index
+                    )
+                    results[transaction_obj.id] = tag_code
+                    if tag_code:
+                        pending[transaction_obj.id] = (transaction_obj, tag_code, confidence, notes)
+            
+            if len(pending) >= self.engine.PERSIST_BATCH_SIZE:
+                self.engine.persist_tags(company, pending.values())
+                pending = {}
+        
+        self.engine.persist_tags(company, pending.values())
         
         return results
     
-    def retag_company_transactions(self, company_code: str) -> int:
+    def retag_company_transactions(self, company_code: str, batch_size: int = 1000) -> int:
         """
         Re-tag all transactions for a specific company.
         
         Args:
             company_code: Code of the company
+            batch_size: Number of tagged transaction IDs to load at a time
             
         Returns:
             int: Number of transactions processed
@@ -83,14 +133,26 @@ class AutoTagService:
         except Company.DoesNotExist:
             return 0
         
-        # Get all transactions that have been tagged by this company
-        existing_tags = TransactionTag.objects.filter(company=company)
-        transaction_ids = list(existing_tags.values_list('transaction_id', flat=True))
-        
-        # Process them
-        results = self.tag_multiple_transactions(transaction_ids, company_code)
+        # Walk the transactions tagged by this company with a keyset cursor
+        # on transaction_id, so only one batch of IDs is in memory at a time
+        existing_tags = TransactionTag.objects.filter(company=company).order_by('transaction_id')
+        processed = 0
+        last_id = 0
+        
+        while True:
+            transaction_ids = list(
+                existing_tags.filter(
+                    transaction_id__gt=last_id
+                ).values_list('transaction_id', flat=True)[:batch_size]
+            )
+            if not transaction_ids:
+                break
+            
+            results = self.tag_multiple_transactions(transaction_ids, company_code)
+            processed += len(results)
+            last_id = transaction_ids[-1]
         
-        return len(results)
+        return processed
     
     @transaction.atomic
     def create_or_update_rule(
@@ -149,23 +211,23 @@ class AutoTagService:
         except Company.DoesNotExist:
             return {}
         
-        total_tags = TransactionTag.objects.filter(company=company).count()
-        tagged_count = TransactionTag.objects.filter(
-            company=company,
-            tag_code__isnull=False
-        ).count()
+        company_tags = TransactionTag.objects.filter(company=company)
         
-        # Get tag distribution
-        tag_distribution = {}
-        tags = TransactionTag.objects.filter(
-            company=company,
+        # Both counts in one query; COUNT(tag_code) skips NULL tags
+        counts = company_tags.aggregate(
+            total=models.Count('id'),
+            tagged=models.Count('tag_code')
+        )
+        total_tags = counts['total']
+        tagged_count = counts['tagged']
+        
+        # Get tag distribution (top 10 tags), sorted and limited in the database
+        tags = company_tags.filter(
             tag_code__isnull=False
         ).values('tag_code').annotate(
             count=models.Count('tag_code')
-        ).order_by('-count')
-        
-        for tag_data in tags[:10]:  # Top 10 tags
-            tag_distribution[tag_data['tag_code']] = tag_data['count']
+        ).order_by('-count')[:10]
+        tag_distribution = {tag_data['tag_code']: tag_data['count'] for tag_data in tags}
         
         return {
             'total_transactions': total_tags,
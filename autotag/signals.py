@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import TaggingRule
+from .rule_engine import AutoTagEngine
+
+
+@receiver(post_save, sender=TaggingRule)
+@receiver(post_delete, sender=TaggingRule)
+def invalidate_cached_rules(sender, instance, **kwargs):
+    """Drop cached active rules for the rule's company when a rule changes."""
+    AutoTagEngine.invalidate_rules(instance.company_id)
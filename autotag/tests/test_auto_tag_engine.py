@@ -1,9 +1,11 @@
 from django.test import TestCase
 from django.utils import timezone
 from decimal import Decimal
+import timeit
 from unittest.mock import Mock, patch
 from autotag.rule_engine import AutoTagEngine
 from autotag.models import Company, TaggingRule, TransactionTag
+from transactions.models import Transaction
 from autotag.tests.factories import (
     TransactionFactory, ExternalDataFactory, CompanyFactory,
     TaggingRuleFactory, SimpleRuleFactory, ConditionalRuleFactory,
@@ -561,4 +563,263 @@ class TestAutoTagEngine(TestCase):
         self.assertEqual(result_b, "COMPANY_B_TAG")
         
         # Should have separate tags for each company
-        self.assertEqual(TransactionTag.objects.filter(transaction=self.transaction).count(), 2)
\ No newline at end of file
+        self.assertEqual(TransactionTag.objects.filter(transaction=self.transaction).count(), 2)
+    
+    def test_tag_transaction_builds_cel_context_once(self):
+        """Test that CEL rules on one transaction share a single context"""
+        for priority, expression in [(100, "transaction.source == 'retail' ? 'RETAIL' : null"),
+                                     (110, "metadata.customer_tier == 'gold' ? 'GOLD' : null")]:
+            TaggingRuleFactory(
+                company=self.company,
+                rule_type='cel',
+                priority=priority,
+                rule_config={"expression": expression}
+            )
+        
+        cel_processor = self.engine.PROCESSORS['cel']
+        with patch.object(cel_processor, 'build_context', wraps=cel_processor.build_context) as mock_build:
+            result = self.engine.tag_transaction(self.transaction, self.company)
+        
+        self.assertEqual(result, "GOLD")
+        self.assertEqual(mock_build.call_count, 1)
+    
+    def test_active_rules_cached_until_rule_changes(self):
+        """Test that active rules are cached per company and refreshed when a rule is saved"""
+        rule = SimpleRuleFactory(
+            company=self.company,
+            rule_config={"mappings": {"product_code": {"PROD_001": "FIRST_TAG"}}}
+        )
+        
+        self.assertEqual(self.engine.tag_transaction(self.transaction, self.company), "FIRST_TAG")
+        
+        with self.assertNumQueries(0):
+            rules, _ = self.engine.get_active_rules(self.company)
+        self.assertEqual([r.id for r in rules], [rule.id])
+        
+        rule.rule_config = {"mappings": {"product_code": {"PROD_001": "SECOND_TAG"}}}
+        rule.save()
+        
+        self.assertEqual(self.engine.tag_transaction(self.transaction, self.company), "SECOND_TAG")
+    
+    def test_conditional_rules_compiled_once_per_load(self):
+        """Test that conditional rules compile when rules load and recompile after an edit"""
+        rule = ConditionalRuleFactory(
+            company=self.company,
+            rule_config={
+                "conditions": [
+                    {"field": "source", "operator": "equals", "value": "online", "tag": "ONLINE_TAG"}
+                ]
+            }
+        )
+        conditional = self.engine.PROCESSORS['conditional']
+        
+        with patch.object(conditional, 'compile_conditions', wraps=conditional.compile_conditions) as mock_compile:
+            self.assertEqual(self.engine.tag_transaction(self.transaction, self.company), "ONLINE_TAG")
+            self.assertEqual(self.engine.tag_transaction(self.transaction, self.company), "ONLINE_TAG")
+            self.assertEqual(mock_compile.call_count, 1)
+            
+            # An in-place edit reaches the engine through save() and the rule version
+            rule.rule_config["conditions"][0]["tag"] = "EDITED_TAG"
+            rule.save()
+            self.assertEqual(self.engine.tag_transaction(self.transaction, self.company), "EDITED_TAG")
+            self.assertEqual(mock_compile.call_count, 2)
+    
+    def test_many_way_or_rule_faster_than_interpreter(self):
+        """Test that a loaded 101-way OR rule evaluates well above interpreter speed"""
+        many_conditions = [
+            {"field": "product_code", "operator": "equals", "value": f"OTHER_{i:03d}"}
+            for i in range(100)
+        ]
+        many_conditions.append({"field": "product_code", "operator": "equals", "value": "PROD_001"})
+        ConditionalRuleFactory(
+            company=self.company,
+            rule_config={
+                "conditions": [
+                    {"conditions": many_conditions, "operator": "or", "tag": "MANY_OR_TAG"}
+                ]
+            }
+        )
+        rules, simple_index = self.engine.get_active_rules(self.company)
+        metadata = self.external_data.metadata
+        conditional = self.engine.PROCESSORS['conditional']
+        
+        # The 101 equals leaves collapse into one set lookup
+        self.assertEqual(len(conditional._compile_group_members('or', many_conditions)), 1)
+        
+        def engine_path():
+            return self.engine.compute_tag(self.transaction, rules, simple_index, metadata=metadata)[0]
+        
+        def interpreter_path():
+            return conditional.process(self.transaction, metadata, rules[0].rule_config)
+        
+        self.assertEqual(engine_path(), "MANY_OR_TAG")
+        self.assertEqual(interpreter_path(), "MANY_OR_TAG")
+        
+        # Best of several runs keeps scheduler noise out; the compiled path is
+        # normally 20x or more ahead, so 3x only trips on a real regression
+        number = 200
+        engine_time = min(timeit.repeat(engine_path, number=number, repeat=5))
+        interpreter_time = min(timeit.repeat(interpreter_path, number=number, repeat=5))
+        self.assertLess(engine_time * 3, interpreter_time)
+    
+    def test_cel_conditions_fused_once_per_load(self):
+        """Test that a CEL conditions list is fused when rules load and again after an edit"""
+        rule = TaggingRuleFactory(
+            company=self.company,
+            rule_type='cel',
+            rule_config={
+                "conditions": [
+                    {"expression": "transaction.source == 'retail'", "tag": "RETAIL_TAG"}
+                ],
+                "default_tag": "FALLBACK"
+            }
+        )
+        cel_processor = self.engine.PROCESSORS['cel']
+        
+        with patch.object(cel_processor, '_fused_conditions', wraps=cel_processor._fused_conditions) as mock_fuse:
+            self.assertEqual(self.engine.tag_transaction(self.transaction, self.company), "FALLBACK")
+            self.assertEqual(self.engine.tag_transaction(self.transaction, self.company), "FALLBACK")
+            self.assertEqual(mock_fuse.call_count, 1)
+            
+            # An in-place edit reaches the engine through save() and the rule version
+            rule.rule_config["conditions"].append(
+                {"expression": "transaction.source == 'online'", "tag": "ONLINE_TAG"}
+            )
+            rule.save()
+            self.assertEqual(self.engine.tag_transaction(self.transaction, self.company), "ONLINE_TAG")
+            self.assertEqual(mock_fuse.call_count, 2)
+    
+    def test_tag_transactions_bulk(self):
+        """Test tagging several transactions at once with one metadata query"""
+        SimpleRuleFactory(
+            company=self.company,
+            rule_config={"mappings": {"customer_tier": {"gold": "GOLD_TAG"}}}
+        )
+        other = TransactionFactory(product_code="PROD_002")
+        transactions = [
+            Transaction.objects.get(id=self.transaction.id),
+            Transaction.objects.get(id=other.id),
+        ]
+        self.engine.get_active_rules(self.company)
+        
+        # metadata lookup + bulk upsert
+        with self.assertNumQueries(2):
+            results = self.engine.tag_transactions(transactions, self.company)
+        
+        self.assertEqual(results, {self.transaction.id: "GOLD_TAG", other.id: None})
+        self.assertEqual(
+            TransactionTag.objects.get(transaction=self.transaction, company=self.company).tag_code,
+            "GOLD_TAG"
+        )
+        self.assertFalse(TransactionTag.objects.filter(transaction=other, company=self.company).exists())
+    
+    def test_non_mapping_metadata_is_a_per_rule_failure(self):
+        """Test metadata that is not a dict fails the rules reading it, not the whole batch"""
+        SimpleRuleFactory(
+            company=self.company,
+            priority=10,
+            rule_config={"mappings": {"customer_tier": {"gold": "GOLD_TAG"}}}
+        )
+        SimpleRuleFactory(
+            company=self.company,
+            priority=20,
+            rule_config={"mappings": {"product_code": {"PROD_002": "PRODUCT_TAG"}}}
+        )
+        bad = TransactionFactory(product_code="PROD_BAD")
+        ExternalDataFactory(transaction=bad, metadata="customer_tier")
+        good = TransactionFactory(product_code="PROD_002")
+        rules, simple_index = self.engine.get_active_rules(self.company)
+        
+        # The metadata rule raises inside the per-rule handling; the rule
+        # after it is still visited
+        with patch.object(
+            self.engine.PROCESSORS['simple'], 'process', wraps=self.engine.PROCESSORS['simple'].process
+        ) as mock_process:
+            tag_code, _, _ = self.engine.compute_tag(
+                Transaction.objects.get(id=bad.id), rules, simple_index
+            )
+        self.assertIsNone(tag_code)
+        self.assertEqual(mock_process.call_count, 2)
+        
+        results = self.engine.tag_transactions(
+            Transaction.objects.filter(id__in=[bad.id, good.id]).order_by('id'), self.company
+        )
+        self.assertEqual(results, {bad.id: None, good.id: "PRODUCT_TAG"})
+    
+    def test_tag_transactions_duplicate_transactions(self):
+        """Test a transaction listed twice is upserted once"""
+        SimpleRuleFactory(
+            company=self.company,
+            rule_config={"mappings": {"product_code": {"PROD_001": "DUPLICATE_TAG"}}}
+        )
+        transactions = [
+            Transaction.objects.get(id=self.transaction.id),
+            Transaction.objects.get(id=self.transaction.id),
+        ]
+        
+        with patch.object(self.engine, 'persist_tags', wraps=self.engine.persist_tags) as mock_persist:
+            results = self.engine.tag_transactions(transactions, self.company)
+        
+        self.assertEqual(results, {self.transaction.id: "DUPLICATE_TAG"})
+        persisted = list(mock_persist.call_args.args[1])
+        self.assertEqual([row[0].id for row in persisted], [self.transaction.id])
+        self.assertIs(persisted[0][0], transactions[-1])
+        self.assertEqual(
+            TransactionTag.objects.filter(transaction=self.transaction, company=self.company).count(), 1
+        )
+    
+    def test_persist_tags_created_at_not_after_updated_at(self):
+        """Test fresh upserted rows never show created_at later than updated_at"""
+        self.engine.persist_tags(self.company, [(self.transaction, "STAMPED_TAG", 1.0, "")])
+        
+        tag = TransactionTag.objects.get(transaction=self.transaction, company=self.company)
+        self.assertLessEqual(tag.created_at, tag.updated_at)
+    
+    def test_tag_transaction_retag_is_single_upsert(self):
+        """Test that re-tagging with cached rules costs one query and keeps one row"""
+        SimpleRuleFactory(
+            company=self.company,
+            rule_config={"mappings": {"product_code": {"PROD_001": "UPSERT_TAG"}}}
+        )
+        self.engine.tag_transaction(self.transaction, self.company)
+        
+        with self.assertNumQueries(1):
+            result = self.engine.tag_transaction(self.transaction, self.company)
+        
+        self.assertEqual(result, "UPSERT_TAG")
+        self.assertEqual(
+            TransactionTag.objects.filter(transaction=self.transaction, company=self.company).count(), 1
+        )
+    
+    def test_transaction_field_rules_skip_metadata_lookup(self):
+        """Test that metadata is not fetched when no rule reads it"""
+        SimpleRuleFactory(
+            company=self.company,
+            rule_config={"mappings": {"product_code": {"PROD_001": "FIELD_TAG"}}}
+        )
+        transaction = Transaction.objects.get(id=self.transaction.id)
+        self.engine.get_active_rules(self.company)
+        
+        # bulk upsert only, no ExternalData query
+        with self.assertNumQueries(1):
+            result = self.engine.tag_transaction(transaction, self.company)
+        
+        self.assertEqual(result, "FIELD_TAG")
+    
+    def test_cel_rules_compiled_at_load_and_skip_unused_metadata(self):
+        """Test that CEL programs compile when rules load and metadata is only fetched if read"""
+        expression = "transaction.product_code == 'PROD_001' ? 'CEL_FIELD_TAG' : null"
+        TaggingRuleFactory(
+            company=self.company,
+            rule_type='cel',
+            rule_config={"expression": expression}
+        )
+        transaction = Transaction.objects.get(id=self.transaction.id)
+        self.engine.get_active_rules(self.company)
+        self.assertIn(expression, self.engine.PROCESSORS['cel']._program_cache)
+        
+        # bulk upsert only, no ExternalData query
+        with self.assertNumQueries(1):
+            result = self.engine.tag_transaction(transaction, self.company)
+        
+        self.assertEqual(result, "CEL_FIELD_TAG")
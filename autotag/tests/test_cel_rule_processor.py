@@ -1,5 +1,6 @@
 from django.test import TestCase
 from decimal import Decimal
+from unittest.mock import patch
 from autotag.rule_engine import CelRuleProcessor
 from autotag.tests.factories import TransactionFactory, ExternalDataFactory
 
@@ -7,15 +8,18 @@ from autotag.tests.factories import TransactionFactory, ExternalDataFactory
 class TestCelRuleProcessor(TestCase):
     """Comprehensive tests for CEL rule processor functionality"""
     
-    def setUp(self):
-        self.processor = CelRuleProcessor()
-        self.transaction = TransactionFactory(
+    @classmethod
+    def setUpTestData(cls):
+        cls.transaction = TransactionFactory(
             product_code="PREMIUM_001",
             produce_rate=Decimal('1500.00'),
             source="online",
             jurisdiction="us",
             ledger_type="credit"
         )
+    
+    def setUp(self):
+        self.processor = CelRuleProcessor()
         self.metadata = {
             'customer_tier': 'gold',
             'amount': 2000.00,
@@ -203,4 +207,122 @@ class TestCelRuleProcessor(TestCase):
         }
         
         result = self.processor.process(self.transaction, {}, rule_config)
-        self.assertEqual(result, "LEGACY_SCRIPT_TAG")
\ No newline at end of file
+        self.assertEqual(result, "LEGACY_SCRIPT_TAG")
+    
+    def test_compiled_program_cache_reused(self):
+        """Test that an expression is compiled once and reused across transactions"""
+        rule_config = {
+            "expression": "transaction.source == 'online' ? 'ONLINE_TAG' : null"
+        }
+        other_transaction = TransactionFactory(source="retail")
+        
+        self.assertEqual(self.processor.process(self.transaction, {}, rule_config), "ONLINE_TAG")
+        program = self.processor._program_cache[rule_config["expression"]]
+        
+        self.assertIsNone(self.processor.process(other_transaction, {}, rule_config))
+        self.assertIs(self.processor._program_cache[rule_config["expression"]], program)
+        self.assertEqual(len(self.processor._program_cache), 1)
+    
+    def test_now_added_only_when_referenced(self):
+        """Test that 'now' is available to expressions that use it and skipped otherwise"""
+        context = self.processor.build_context(self.transaction, {})
+        self.assertNotIn('now', context)
+        
+        self.processor.process_with_context(context, {"expression": "transaction.source"})
+        self.assertNotIn('now', context)
+        
+        result = self.processor.process_with_context(
+            context, {"expression": "size(now) > 0 ? 'HAS_NOW' : null"}
+        )
+        self.assertEqual(result, "HAS_NOW")
+        self.assertIn('now', context)
+    
+    def test_conditions_fused_into_single_program(self):
+        """Test that a conditions list is evaluated as one fused program with the same results"""
+        rule_config = {
+            "conditions": [
+                {"expression": "transaction.source == 'retail'", "tag": "RETAIL_TAG"},
+                {"expression": "metadata.customer_tier == 'gold'", "tag": "GOLD \"TIER\""},
+            ],
+            "default_tag": "FALLBACK"
+        }
+        
+        fused = self.processor._fused_conditions(rule_config["conditions"])
+        self.assertIn(fused, self.processor._program_cache)
+        
+        def process_fused(metadata):
+            context = self.processor.build_context(self.transaction, metadata)
+            return self.processor.process_with_context(context, rule_config, fused)
+        
+        self.assertEqual(process_fused(self.metadata), 'GOLD "TIER"')
+        self.assertEqual(process_fused({'customer_tier': 'silver'}), "FALLBACK")
+        
+        # A condition that errors falls back to per-condition evaluation
+        self.assertEqual(process_fused({}), "FALLBACK")
+        
+        # Without a fused expression the conditions are evaluated one by one
+        for metadata in (self.metadata, {'customer_tier': 'silver'}, {}):
+            self.assertEqual(
+                self.processor.process(self.transaction, metadata, rule_config),
+                process_fused(metadata)
+            )
+    
+    def test_native_closure_matches_celpy(self):
+        """Test that natively compiled expressions agree with celpy, including fallbacks"""
+        context = self.processor.build_context(self.transaction, self.metadata)
+        expressions = [
+            "transaction.product_code.startsWith('PREM') && metadata.customer_tier == 'gold' ? 'NATIVE_TAG' : null",
+            "double(transaction.produce_rate) > 100.0 || !has(metadata.region)",
+            "metadata.customer_tier > 1",  # mixed types: celpy decides
+            "metadata.missing == 'x' || true",  # error absorbed by ||
+            "metadata.missing == 'x' || false",  # error kept: celpy decides
+            "metadata.customer_tier && false",  # non-bool absorbed by &&
+            "metadata.customer_tier in ['gold', 'platinum'] && transaction.product_code.matches('^PREM')",
+            "transaction.source.matches('line$') && !transaction.source.matches('^retail')",
+            "(1 < 2) ? transaction.source : 'unreachable'",
+        ]
+        
+        for expression in expressions:
+            program, _, native = self.processor._get_program(expression)
+            self.assertIsNotNone(native, expression)
+            try:
+                expected = program.evaluate(dict(context))
+            except Exception as e:
+                expected = type(e)
+            try:
+                actual = self.processor._evaluate(expression, dict(context))
+            except Exception as e:
+                actual = type(e)
+            self.assertEqual(actual, expected, expression)
+        
+        # Syntax outside the subset is left to celpy
+        self.assertIsNone(self.processor._get_program("size(metadata) > 0")[2])
+        # So is a literal pattern celpy's regex engine rejects
+        self.assertIsNone(self.processor._get_program("transaction.source.matches('(')")[2])
+    
+    def test_context_entries_converted_on_first_reference(self):
+        """Test that metadata is only converted for expressions that read it"""
+        context = self.processor.build_context(self.transaction, self.metadata)
+        
+        result = self.processor.process_with_context(
+            context, {"expression": "transaction.product_code == 'PREMIUM_001' ? 'TXN_TAG' : null"}
+        )
+        self.assertEqual(result, "TXN_TAG")
+        self.assertIn('transaction', context)
+        self.assertNotIn('metadata', context)
+        
+        result = self.processor.process_with_context(
+            context, {"expression": "metadata.customer_tier == 'gold' ? 'GOLD_TAG' : null"}
+        )
+        self.assertEqual(result, "GOLD_TAG")
+        self.assertIn('metadata', context)
+    
+    def test_invalid_expression_parsed_once(self):
+        """Test that an expression that fails to compile is not parsed again"""
+        rule_config = {"expression": "transaction.product_code ==", "default_tag": "DEFAULT"}
+        
+        with patch.object(self.processor.env, 'compile', wraps=self.processor.env.compile) as mock_compile:
+            self.assertEqual(self.processor.process(self.transaction, {}, rule_config), "DEFAULT")
+            self.assertEqual(self.processor.process(self.transaction, {}, rule_config), "DEFAULT")
+        
+        self.assertEqual(mock_compile.call_count, 1)
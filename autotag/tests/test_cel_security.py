@@ -6,13 +6,16 @@ from autotag.tests.factories import TransactionFactory
 class TestCelSecurity(TestCase):
     """Comprehensive security tests for CEL implementation"""
     
-    def setUp(self):
-        self.processor = CelRuleProcessor()
-        self.transaction = TransactionFactory(
+    @classmethod
+    def setUpTestData(cls):
+        cls.transaction = TransactionFactory(
             product_code="TEST_001",
             source="online"
         )
     
+    def setUp(self):
+        self.processor = CelRuleProcessor()
+    
     def test_no_file_access_possible(self):
         """Test that file access is not possible in CEL"""
         # These expressions should all fail to compile or evaluate safely
@@ -549,4 +549,153 @@ class TestConditionalRuleProcessor(TestCase):
         }
         
         result = self.processor.process(self.transaction, self.metadata, rule_config)
-        self.assertIsNone(result)
\ No newline at end of file
+        self.assertIsNone(result)
+    
+    def test_compiled_conditions_match_interpreter(self):
+        """Test that compiled conditions agree with the direct interpreter"""
+        self.metadata['tags'] = ['x', 'y']  # unhashable, for the set lookup fallback
+        conditions = [
+            {"field": "product_code", "operator": "equals", "value": "PROD_A"},
+            {"field": "source", "operator": "not_equals", "value": "online"},
+            {"field": "produce_rate", "operator": "greater_than", "value": 1000},
+            {"field": "produce_rate", "operator": "less_than", "value": "abc"},
+            {"field": "metadata.category", "operator": "contains", "value": "prem"},
+            {"field": "metadata.customer_tier", "operator": "regex", "value": "^go"},
+            {"field": "metadata.missing", "operator": "greater_than", "value": 5},
+            {"field": "source", "operator": "unknown", "value": "online"},
+            {
+                "conditions": [
+                    {"field": "source", "operator": "equals", "value": "online"},
+                    {"field": "metadata.category", "operator": "equals", "value": "basic"}
+                ],
+                "operator": "or"
+            },
+            {
+                "conditions": [
+                    {"field": "metadata.tags", "operator": "equals", "value": "x"},
+                    {"field": "metadata.tags", "operator": "equals", "value": "y"},
+                    {"field": "source", "operator": "equals", "value": "retail"},
+                    {"field": "source", "operator": "equals", "value": "online"}
+                ],
+                "operator": "or"
+            },
+            {
+                "conditions": [
+                    {"field": "metadata.category", "operator": "contains", "value": "xyz"},
+                    {"field": "metadata.category", "operator": "contains", "value": "m.u"},
+                    {"field": "metadata.category", "operator": "contains", "value": "emi"}
+                ],
+                "operator": "or"
+            },
+            {
+                "conditions": [
+                    {"field": "metadata.customer_tier", "operator": "regex", "value": "^sil"},
+                    {"field": "metadata.customer_tier", "operator": "regex", "value": "ld$"},
+                    {"field": "metadata.payment_method", "operator": "regex", "value": "(c)a\\1"},
+                    {"field": "metadata.payment_method", "operator": "regex", "value": "^x"}
+                ],
+                "operator": "or"
+            },
+            {
+                "conditions": [
+                    {"field": "source", "operator": "not_equals", "value": "retail"},
+                    {"field": "source", "operator": "not_equals", "value": "online"}
+                ],
+                "operator": "and"
+            },
+            {
+                "conditions": [
+                    {"field": "source", "operator": "equals", "value": "online"},
+                    {"conditions": [
+                        {"field": "metadata.customer_tier", "operator": "equals", "value": "gold"},
+                        {"conditions": [], "operator": "and"}
+                    ]}
+                ],
+                "operator": "and"
+            },
+            {"conditions": [], "operator": "xor"}
+        ]
+        
+        for condition in conditions:
+            self.assertEqual(
+                self.processor._compile_condition(condition)(self.transaction, self.metadata),
+                self.processor._walk_condition(self.transaction, self.metadata, condition),
+                f"Mismatch for {condition}"
+            )
+    
+    def test_cost_ordering_keeps_interpreter_short_circuit(self):
+        """Test a cheap leaf that raises does not fire before a costlier one that decides the group"""
+        metadata = dict(self.metadata, huge=10 ** 400)
+        overflow = {"field": "metadata.huge", "operator": "greater_than", "value": 1}
+        conditions = [
+            {
+                "conditions": [
+                    {"field": "source", "operator": "regex", "value": "^retail"},
+                    overflow
+                ],
+                "operator": "and"
+            },
+            {
+                "conditions": [
+                    {"field": "source", "operator": "regex", "value": "^online"},
+                    overflow
+                ],
+                "operator": "or"
+            }
+        ]
+        
+        for condition in conditions:
+            self.assertEqual(
+                self.processor._compile_condition(condition)(self.transaction, metadata),
+                self.processor._walk_condition(self.transaction, metadata, condition),
+                f"Mismatch for {condition}"
+            )
+        
+        # When the written order reaches the raising leaf, the error is kept
+        reached = {"conditions": [overflow], "operator": "and"}
+        with self.assertRaises(OverflowError):
+            self.processor._compile_condition(reached)(self.transaction, metadata)
+        
+        # A cheaper member written after the raising leaf decides the group
+        # first, so the error the interpreter raises is skipped
+        for operator, deciding in (("and", "retail"), ("or", "online")):
+            skipped = {
+                "conditions": [
+                    overflow,
+                    {"field": "source", "operator": "equals", "value": deciding}
+                ],
+                "operator": operator
+            }
+            with self.assertRaises(OverflowError):
+                self.processor._walk_condition(self.transaction, metadata, skipped)
+            self.assertEqual(
+                self.processor._compile_condition(skipped)(self.transaction, metadata),
+                operator == "or"
+            )
+    
+    def test_compiled_rule_matches_process(self):
+        """Test a conditions list compiled once gives the same tags as process()"""
+        rule_config = {
+            "conditions": [
+                {"field": "source", "operator": "equals", "value": "retail", "tag": "RETAIL_TAG"},
+                {
+                    "conditions": [
+                        {"field": "metadata.customer_tier", "operator": "equals", "value": "silver"},
+                        {"field": "metadata.customer_tier", "operator": "equals", "value": "gold"}
+                    ],
+                    "operator": "or",
+                    "tag": "TIER_TAG"
+                }
+            ]
+        }
+        compiled = self.processor.compile_conditions(rule_config["conditions"])
+        
+        for metadata in (self.metadata, {'customer_tier': 'bronze'}, {}):
+            self.assertEqual(
+                self.processor.process_compiled(compiled, self.transaction, metadata),
+                self.processor.process(self.transaction, metadata, rule_config)
+            )
+        
+        # Lists the compiler cannot take are left to process()
+        self.assertIsNone(self.processor.compile_conditions({"field": "source"}))
+        self.assertIsNone(self.processor.compile_conditions(["source"]))
@@ -1,4 +1,5 @@
 from django.test import TestCase
+from unittest.mock import patch
 from django.db import models
 from decimal import Decimal
 from autotag.services import AutoTagService
@@ -146,6 +147,41 @@ class TestAutoTagService(TestCase):
         for i, txn in enumerate(self.transactions):
             self.assertEqual(results[txn.id], f'BATCH_TAG_{i:03d}')
     
+    def test_tag_multiple_transactions_duplicate_ids(self):
+        """Test repeated ids are tagged once and upserted without duplicate rows"""
+        SimpleRuleFactory(
+            company=self.company,
+            rule_config={
+                'mappings': {
+                    'product_code': {
+                        'PROD_000': 'DUPLICATE_TAG'
+                    }
+                }
+            }
+        )
+        
+        txn_id = self.transactions[0].id
+        engine = self.service.engine
+        with patch.object(engine, 'persist_tags', wraps=engine.persist_tags) as mock_persist:
+            # batch_size=1 puts each repeat in its own batch
+            results = self.service.tag_multiple_transactions(
+                [txn_id, self.transactions[1].id, txn_id, txn_id],
+                self.company.code,
+                batch_size=1
+            )
+        
+        self.assertEqual(results, {txn_id: 'DUPLICATE_TAG', self.transactions[1].id: None})
+        persisted_ids = [
+            row[0].id
+            for call in mock_persist.call_args_list
+            for row in call.args[1]
+        ]
+        self.assertEqual(persisted_ids, [txn_id])
+        self.assertEqual(
+            TransactionTag.objects.filter(transaction_id=txn_id, company=self.company).count(),
+            1
+        )
+    
     def test_tag_multiple_transactions_company_not_found(self):
         """Test multiple tagging with non-existent company"""
         transaction_ids = [txn.id for txn in self.transactions]
@@ -185,6 +221,34 @@ class TestAutoTagService(TestCase):
         self.assertIsNone(results[self.transactions[3].id])
         self.assertIsNone(results[self.transactions[4].id])
     
+    def test_tag_multiple_transactions_simple_rules_use_metadata(self):
+        """Test simple-only batches map metadata fields and handle missing external data"""
+        SimpleRuleFactory(
+            company=self.company,
+            rule_config={
+                'mappings': {
+                    'product_code': {'PROD_001': 'PRODUCT_TAG'},
+                    'customer_tier': {'gold': 'GOLD_TAG'}
+                }
+            }
+        )
+        no_metadata_txn = TransactionFactory(product_code="PROD_999")
+        
+        transaction_ids = [txn.id for txn in self.transactions] + [no_metadata_txn.id]
+        results = self.service.tag_multiple_transactions(
+            transaction_ids,
+            self.company.code
+        )
+        
+        self.assertEqual(results[self.transactions[1].id], 'PRODUCT_TAG')
+        self.assertEqual(results[self.transactions[2].id], 'GOLD_TAG')
+        self.assertIsNone(results[self.transactions[0].id])
+        self.assertIsNone(results[no_metadata_txn.id])
+        self.assertEqual(
+            TransactionTag.objects.get(transaction=self.transactions[2], company=self.company).tag_code,
+            'GOLD_TAG'
+        )
+    
     def test_retag_company_transactions(self):
         """Test re-tagging existing company transactions"""
         # Create initial tags
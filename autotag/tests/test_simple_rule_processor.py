@@ -2,7 +2,8 @@ from django.test import TestCase
 from decimal import Decimal
 from autotag.rule_engine import SimpleRuleProcessor
 from autotag.tests.factories import (
-    TransactionFactory, ExternalDataFactory, PremiumTransactionFactory
+    TransactionFactory, ExternalDataFactory, PremiumTransactionFactory,
+    CompanyFactory, SimpleRuleFactory
 )
 
 
@@ -333,4 +334,37 @@ class TestSimpleRuleProcessor(TestCase):
         }
         
         result = self.processor.process(self.transaction, metadata_with_none, rule_config)
-        self.assertEqual(result, "NONE_TAG")  # Should convert None to "None" string
\ No newline at end of file
+        self.assertEqual(result, "NONE_TAG")  # Should convert None to "None" string
+    
+    def test_build_index_candidates_match_process(self):
+        """Test that index candidates agree with process() results"""
+        company = CompanyFactory()
+        rules = [
+            SimpleRuleFactory(
+                company=company,
+                rule_config={"mappings": {"product_code": {"PROD_A": "TAG_A"}}}
+            ),
+            SimpleRuleFactory(
+                company=company,
+                rule_config={"mappings": {"product_code": {"PROD_Z": "TAG_Z"}}}
+            ),
+            SimpleRuleFactory(
+                company=company,
+                rule_config={"mappings": {"amount": {"1500.0": "AMOUNT_TAG"}}}
+            ),
+            SimpleRuleFactory(
+                company=company,
+                rule_config={"mappings": {"product_code": "not_a_dict"}}
+            ),
+        ]
+        
+        index = self.processor.build_index(rules)
+        candidates = self.processor.candidate_rule_ids(index, self.transaction, self.metadata)
+        
+        # Unindexable rules are left out so they are always evaluated
+        self.assertNotIn(rules[3].id, index['rule_ids'])
+        self.assertEqual(candidates, {rules[0].id, rules[2].id})
+        
+        for rule in rules[:3]:
+            result = self.processor.process(self.transaction, self.metadata, rule.rule_config)
+            self.assertEqual(result is not None, rule.id in candidates)
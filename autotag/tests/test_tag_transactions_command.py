@@ -0,0 +1,197 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import Future
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from autotag import workers
+from autotag.models import TransactionTag
+from autotag.tests.factories import (
+    TransactionFactory, CompanyFactory, SimpleRuleFactory
+)
+
+
+class InlineExecutor:
+    """Stand-in for ProcessPoolExecutor that runs submissions in this process"""
+
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.submitted = 0
+        InlineExecutor.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class TestTagTransactionsCommand(TestCase):
+    """Test the tag_transactions management command"""
+
+    def setUp(self):
+        self.company = CompanyFactory(code="CMD_CO")
+        self.transactions = [
+            TransactionFactory(product_code=f"CMD_{i:03d}")
+            for i in range(5)
+        ]
+        SimpleRuleFactory(
+            company=self.company,
+            rule_config={
+                'mappings': {
+                    'product_code': {
+                        txn.product_code: f"TAG_{i:03d}"
+                        for i, txn in enumerate(self.transactions)
+                    }
+                }
+            }
+        )
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('tag_transactions', *args, stdout=out)
+        return out.getvalue()
+
+    def test_all_tags_every_untagged_transaction(self):
+        """Test --all tags every transaction that has no tag yet"""
+        output = self.run_command(self.company.code, '--all')
+
+        self.assertIn('Tagged 5/5 transactions', output)
+        self.assertEqual(
+            TransactionTag.objects.filter(company=self.company).count(),
+            5
+        )
+
+    def test_all_skips_already_tagged_transactions(self):
+        """Test --all leaves existing tags alone and only counts untagged ones"""
+        TransactionTag.objects.create(
+            transaction=self.transactions[2],
+            company=self.company,
+            tag_code='MANUAL_TAG'
+        )
+
+        output = self.run_command(self.company.code, '--all')
+
+        self.assertIn('Tagged 4/4 transactions', output)
+        self.assertEqual(
+            TransactionTag.objects.get(
+                transaction=self.transactions[2],
+                company=self.company
+            ).tag_code,
+            'MANUAL_TAG'
+        )
+
+    def test_all_ignores_other_companies_tags(self):
+        """Test a tag for another company does not count as tagged"""
+        other_company = CompanyFactory(code="OTHER_CMD_CO")
+        TransactionTag.objects.create(
+            transaction=self.transactions[0],
+            company=other_company,
+            tag_code='OTHER_TAG'
+        )
+
+        output = self.run_command(self.company.code, '--all')
+
+        self.assertIn('Tagged 5/5 transactions', output)
+
+    def test_all_with_nothing_left_to_tag(self):
+        """Test a second --all run finds nothing to do"""
+        self.run_command(self.company.code, '--all')
+
+        output = self.run_command(self.company.code, '--all')
+
+        self.assertIn('No untagged transactions found', output)
+
+    def test_all_for_company_without_rules(self):
+        """Test --all for a company with no rules visits but tags nothing"""
+        empty_company = CompanyFactory(code="EMPTY_CMD_CO")
+
+        output = self.run_command(empty_company.code, '--all')
+
+        self.assertIn('Tagged 0/5 transactions', output)
+        self.assertFalse(
+            TransactionTag.objects.filter(company=empty_company).exists()
+        )
+
+    def test_all_with_unknown_company(self):
+        """Test --all with an unknown company code fails cleanly"""
+        with self.assertRaises(CommandError) as ctx:
+            self.run_command('NO_SUCH_CO', '--all')
+
+        self.assertIn("Company 'NO_SUCH_CO' not found or inactive", str(ctx.exception))
+
+    def test_all_across_batch_boundaries(self):
+        """Test --all covers every id when batches split the id range"""
+        # Tag every other transaction so batches straddle the gaps
+        for txn in self.transactions[::2]:
+            TransactionTag.objects.create(
+                transaction=txn,
+                company=self.company,
+                tag_code='MANUAL_TAG'
+            )
+
+        output = self.run_command(self.company.code, '--all', '--batch-size', '1')
+
+        self.assertIn('Tagged 2/2 transactions', output)
+        for i, txn in enumerate(self.transactions):
+            expected = 'MANUAL_TAG' if i % 2 == 0 else f"TAG_{i:03d}"
+            self.assertEqual(
+                TransactionTag.objects.get(transaction=txn, company=self.company).tag_code,
+                expected
+            )
+
+    def test_all_with_batch_size_larger_than_total(self):
+        """Test --all with one batch holding every transaction"""
+        output = self.run_command(self.company.code, '--all', '--batch-size', '100')
+
+        self.assertIn('Tagged 5/5 transactions', output)
+
+    def test_requires_a_mode(self):
+        """Test the command refuses to run without a mode flag"""
+        with self.assertRaises(CommandError):
+            self.run_command(self.company.code)
+
+    def test_all_with_workers(self):
+        """Test --workers hands every batch to a spawn-context pool"""
+        InlineExecutor.instances = []
+        with mock.patch(
+            'autotag.management.commands.tag_transactions.ProcessPoolExecutor',
+            InlineExecutor
+        ):
+            output = self.run_command(
+                self.company.code, '--all', '--workers', '2', '--batch-size', '2'
+            )
+
+        self.assertIn('Tagged 5/5 transactions', output)
+        self.assertEqual(len(InlineExecutor.instances), 1)
+        executor = InlineExecutor.instances[0]
+        self.assertEqual(executor.submitted, 3)
+        self.assertEqual(executor.kwargs['max_workers'], 2)
+        self.assertEqual(executor.kwargs['mp_context'].get_start_method(), 'spawn')
+        self.assertIs(executor.kwargs['initializer'], workers.init_worker)
+        self.assertEqual(executor.kwargs['initargs'], (settings.SETTINGS_MODULE,))
+
+    def test_worker_module_imports_before_setup(self):
+        """Test spawned workers can import their entry module before django.setup()"""
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        result = subprocess.run(
+            [sys.executable, '-c', 'import autotag.workers'],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
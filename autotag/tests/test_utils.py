@@ -3,7 +3,8 @@ import json
 from jsonschema import ValidationError
 from autotag.utils import (
     validate_rule_config, validate_metadata_against_schema,
-    export_rules_to_json, import_rules_from_json, generate_sample_rules
+    export_rules_to_json, import_rules_from_json, import_rules_from_dict,
+    generate_sample_rules
 )
 from autotag.models import Company, TaggingRule
 from autotag.tests.factories import CompanyFactory, TaggingRuleFactory
@@ -338,6 +339,15 @@ class TestUtilityFunctions(TestCase):
         self.assertIn('error', result)
         self.assertIn('JSON', result['error'])
     
+    def test_import_rules_from_json_invalid_bytes(self):
+        """Test import with bytes that are not valid UTF-8"""
+        invalid_bytes = b'{"company_code": "\xff\xfe\xfa"}'
+        
+        result = import_rules_from_json(invalid_bytes)
+        
+        self.assertIn('error', result)
+        self.assertIn('JSON', result['error'])
+    
     def test_import_rules_from_json_missing_company_code(self):
         """Test import with missing company code"""
         json_data = {
@@ -431,6 +441,32 @@ class TestUtilityFunctions(TestCase):
         self.assertEqual(updated_rule.rule_type, 'conditional')  # Updated
         self.assertEqual(updated_rule.priority, 50)  # Updated
     
+    def test_import_rules_from_dict_and_bytes(self):
+        """Test import from a parsed document and from raw JSON bytes"""
+        json_data = {
+            'company_code': self.company.code,
+            'rules': [
+                {
+                    'name': 'Dict Rule',
+                    'rule_type': 'simple',
+                    'rule_config': {'mappings': {'field': {'val': 'tag'}}}
+                }
+            ]
+        }
+        
+        result = import_rules_from_dict(json_data)
+        self.assertEqual(result['imported'], 1)
+        
+        result = import_rules_from_json(json.dumps(json_data).encode('utf-8'))
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual(TaggingRule.objects.filter(company=self.company).count(), 1)
+        
+        self.assertIn('error', import_rules_from_dict([]))
+        self.assertIn('error', import_rules_from_dict({
+            'company_code': self.company.code,
+            'rules': 'not_a_list'
+        }))
+    
     def test_generate_sample_rules(self):
         """Test generation of sample rules"""
         sample_rules = generate_sample_rules()
@@ -1,5 +1,5 @@
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Union
 from jsonschema import validate, ValidationError
 
 
@@ -109,33 +109,69 @@ def export_rules_to_json(company_code: str) -> str:
     }, indent=2)
 
 
-def import_rules_from_json(json_data: str) -> Dict[str, Any]:
+def import_rules_from_json(json_data: Union[str, bytes]) -> Dict[str, Any]:
     """
     Import rules from JSON format.
     
     Args:
-        json_data: JSON string containing rules
+        json_data: JSON string (or UTF-8 bytes) containing rules
         
     Returns:
         Dict with import results
     """
-    from .models import Company, TaggingRule
-    
     try:
         data = json.loads(json_data)
-    except json.JSONDecodeError as e:
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        # Bytes that are not valid UTF-8 fail before JSON parsing starts
         return {"error": f"Invalid JSON: {e}"}
     
+    return import_rules_from_dict(data)
+
+
+def import_rules_from_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Import rules from an already-parsed rules document.
+    
+    Args:
+        data: Parsed document with 'company_code' and 'rules' keys
+        
+    Returns:
+        Dict with import results
+    """
+    from .models import Company
+    
+    if not isinstance(data, dict):
+        return {"error": "Rules document must be a JSON object"}
+    
     company_code = data.get('company_code')
     if not company_code:
         return {"error": "Missing company_code in JSON"}
     
+    rules = data.get('rules', [])
+    if not isinstance(rules, list):
+        return {"error": "'rules' must be a list"}
+    
     try:
         company = Company.objects.get(code=company_code)
     except Company.DoesNotExist:
         return {"error": f"Company with code '{company_code}' not found"}
     
-    rules = data.get('rules', [])
+    return import_rules_for_company(company, rules)
+
+
+def import_rules_for_company(company, rules: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Import already-parsed rule dicts for a company.
+    
+    Args:
+        company: Company instance the rules belong to
+        rules: Iterable of rule dicts, consumed one at a time
+        
+    Returns:
+        Dict with import results
+    """
+    from .models import TaggingRule
+    
     results = {
         'imported': 0,
         'errors': []
@@ -0,0 +1,29 @@
+"""
+Process pool entry points for tag_transactions --workers.
+
+Pool processes are started with the spawn method, so they import this module
+before Django is set up. Keep model and service imports inside the functions.
+"""
+import os
+import django
+from django.db import connections
+
+
+def init_worker(settings_module):
+    """Set up Django in a pool process, never reusing a connection it may have inherited."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    # Drop rather than close: closing would shut the parent's socket too
+    for conn in connections.all():
+        conn.connection = None
+    django.setup()
+
+
+def tag_batch(batch_ids, company_code, batch_size):
+    """Tag one batch of transactions inside a pool process."""
+    from autotag.services import AutoTagService
+
+    return batch_ids, AutoTagService().tag_multiple_transactions(
+        batch_ids,
+        company_code,
+        batch_size
+    )